@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import time
 
 # ===================== CONFIG =====================
 st.set_page_config(page_title="AI Study Agent", layout="wide")
@@ -10,6 +11,7 @@ defaults = {
     "user": None,
     "selected_document_id": None,
     "last_uploaded_name": None,
+    "upload_job_id": None,
     "flashcards": None,
     "fc_index": 0,
     "fc_flipped": False,
@@ -97,10 +99,22 @@ if uploaded and uploaded.name != st.session_state.last_uploaded_name:
         if res.status_code == 200:
             st.session_state.last_uploaded_name = uploaded.name
             st.session_state.selected_document_id = res.json()["document_id"]
+            st.session_state.upload_job_id = res.json()["job_id"]
             st.rerun()
         else:
             st.error(res.text)
 
+# ===================== INDEX PROGRESS =====================
+if st.session_state.upload_job_id:
+    job = requests.get(f"{API_BASE}/upload/jobs/{st.session_state.upload_job_id}").json()
+    if job.get("status") in ("queued", "running"):
+        st.progress(job["progress"], text=f"⏳ Đang index: {job['stage']}")
+        time.sleep(2)
+        st.rerun()
+    elif job.get("status") == "failed":
+        st.error(f"❌ Index lỗi: {job.get('error')}")
+    st.session_state.upload_job_id = None
+
 # ===================== CREATE =====================
 if doc:
     c1, c2 = st.columns(2)
@@ -1,6 +1,6 @@
-from core.llm import client
+from core.llm import achat_completion
 
-def extract_topics(text: str):
+async def extract_topics(text: str):
     prompt = f"""
 Bạn là trợ lý học tập.
 Hãy phân tích tài liệu sau và liệt kê các chương/chủ đề chính.
@@ -13,9 +13,9 @@ TÀI LIỆU:
 {text[:4000]}
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
+    # Cùng tài liệu → cùng danh sách chủ đề: lấy lại từ cache
+    return await achat_completion(
+        messages=[{"role": "user", "content": prompt}],
+        cache=True,
+        agent="curriculum"
     )
-
-    return response.choices[0].message.content
@@ -1,43 +1,127 @@
-from core.llm import client
-from rag.rag_tool import retrieve_context_by_document
-import json
-from typing import List, Dict
+from core.llm import stream_chat_completion
+from core.json_stream import JSONArrayStream, aiter_json_items
+from core.tokens import count_tokens, context_budget
+from rag.rag_tool import aretrieve_context_by_document
+from rag.query_embeddings import register_static_query
+from typing import AsyncIterator, List, Dict
 
 # =====================
 # CONFIG
 # =====================
 MAX_CARDS = 10
+TOKEN_BUDGET = 3500          # cả request: prompt + ngữ cảnh + output
+OUTPUT_TOKENS_PER_CARD = 80
+FALLBACK_ANSWER = "Không trích xuất được từ tài liệu"
+
+# Query cố định → embedding được tính sẵn lúc startup
+FLASHCARD_QUERY = register_static_query("""
+        Trích xuất các khái niệm học tập QUAN TRỌNG:
+        - Định nghĩa
+        - Nguyên lý
+        - Ý chính dễ ra đề
+        """)
 
 
-def generate_flashcards_from_context(
+async def generate_flashcards_from_context(
     document_id: int,
-    num_cards: int = MAX_CARDS
+    num_cards: int = MAX_CARDS,
+    cache: bool = True
 ) -> List[Dict[str, str]]:
     """
     Generate flashcards CHUẨN RAG – THEO FILE
     """
+    cards = [
+        card async for card in stream_flashcards_from_context(document_id, num_cards, cache=cache)
+    ]
+    return cards or _fallback_cards(num_cards)
+
+
+async def stream_flashcards_from_context(
+    document_id: int,
+    num_cards: int = MAX_CARDS,
+    cache: bool = True
+) -> AsyncIterator[Dict[str, str]]:
+    """
+    Yield từng flashcard ngay khi model viết xong (JSON mode + parser tăng dần)
+    Output lỗi / bị cắt → vẫn giữ các thẻ hợp lệ đã sinh, không yield gì nếu RAG fail
+    cache=False: luôn gọi LLM (prompt tất định → cache trả lại đúng bộ thẻ cũ)
+    """
 
     # =====================
-    # 1️⃣ GET CONTEXT (THEO document_id)
+    # 1️⃣ GET CONTEXT (THEO document_id, VỪA NGÂN SÁCH TOKEN)
     # =====================
-    context = retrieve_context_by_document(
+    context = await aretrieve_context_by_document(
         document_id=document_id,
-        query="""
-        Trích xuất các khái niệm học tập QUAN TRỌNG:
-        - Định nghĩa
-        - Nguyên lý
-        - Ý chính dễ ra đề
-        """,
-        k=8
+        query=FLASHCARD_QUERY,
+        k=12,
+        max_tokens=context_budget(
+            TOKEN_BUDGET,
+            count_tokens(_build_prompt("", num_cards)),
+            num_cards * OUTPUT_TOKENS_PER_CARD
+        )
     )
 
     if not context:
-        return _fallback_cards(num_cards)
+        return
 
     # =====================
-    # 2️⃣ PROMPT TẠO FLASHCARD
+    # 2️⃣ STREAM + PARSE TỪNG THẺ
     # =====================
-    prompt = f"""
+    parser = JSONArrayStream()
+    tokens = stream_chat_completion(
+        messages=[{"role": "user", "content": _build_prompt(context, num_cards)}],
+        temperature=0.15,
+        cache=cache,
+        agent="flashcard",
+        response_format={"type": "json_object"}
+    )
+    count = 0
+
+    try:
+        async for item in aiter_json_items(tokens, parser):
+            # đủ thẻ → không yield nữa nhưng vẫn đọc hết stream (cache + usage ở cuối stream)
+            if count >= num_cards:
+                continue
+
+            card = _validate_card(item)
+            if not card:
+                parser.skipped += 1
+                continue
+
+            yield card
+            count += 1
+
+    except Exception as e:
+        print("❌ Flashcard error:", e)
+
+    finally:
+        await tokens.aclose()
+
+    truncated = not parser.done and count < num_cards
+    if parser.skipped or truncated:
+        print(f"⚠️ Flashcard: giữ {count} thẻ, bỏ {parser.skipped} thẻ lỗi"
+              + (", output bị cắt" if truncated else ""))
+
+
+def _validate_card(item) -> Dict[str, str] | None:
+    if not isinstance(item, dict):
+        return None
+
+    question = item.get("question")
+    answer = item.get("answer")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if not isinstance(answer, str) or not answer.strip():
+        return None
+
+    return {"question": question.strip(), "answer": answer.strip()}
+
+
+# =====================
+# PROMPT TẠO FLASHCARD
+# =====================
+def _build_prompt(context: str, num_cards: int) -> str:
+    return f"""
 Bạn là AI hỗ trợ ôn thi.
 
 CHỈ sử dụng thông tin trong tài liệu.
@@ -54,13 +138,15 @@ YÊU CẦU:
 - Trả lời ngắn gọn, súc tích
 - Dạng ghi nhớ nhanh
 
-FORMAT JSON THUẦN:
-[
-  {{
-    "question": "Câu hỏi ôn tập",
-    "answer": "Câu trả lời ngắn gọn"
-  }}
-]
+CHỈ TRẢ VỀ JSON OBJECT:
+{{
+  "flashcards": [
+    {{
+      "question": "Câu hỏi ôn tập",
+      "answer": "Câu trả lời ngắn gọn"
+    }}
+  ]
+}}
 
 TÀI LIỆU:
 \"\"\"
@@ -68,41 +154,19 @@ TÀI LIỆU:
 \"\"\"
 """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.15
-        )
-
-        raw = response.choices[0].message.content.strip()
-
-        if raw.startswith("```"):
-            raw = raw.replace("```json", "").replace("```", "").strip()
-
-        cards = json.loads(raw)
-
-        if isinstance(cards, list):
-            valid_cards = [
-                c for c in cards
-                if "question" in c and "answer" in c
-            ]
-            return valid_cards[:num_cards]
-
-    except Exception as e:
-        print("❌ Flashcard error:", e)
-
-    return _fallback_cards(num_cards)
-
 
 # =====================
 # FALLBACK (CHỈ DÙNG KHI RAG FAIL)
 # =====================
+def is_fallback_cards(cards: List[Dict[str, str]]) -> bool:
+    return bool(cards) and cards[0]["answer"] == FALLBACK_ANSWER
+
+
 def _fallback_cards(n: int) -> List[Dict[str, str]]:
     return [
         {
             "question": f"Khái niệm {i + 1}",
-            "answer": "Không trích xuất được từ tài liệu"
+            "answer": FALLBACK_ANSWER
         }
         for i in range(n)
     ]
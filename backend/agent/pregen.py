@@ -0,0 +1,147 @@
+import asyncio
+import os
+import queue
+import threading
+
+from agent.flashcard_agent import generate_flashcards_from_context, is_fallback_cards
+from agent.question_agent import generate_mcq_from_context, is_fallback_quiz
+from database.document import get_live_document_for_source, get_index_source, INDEX_READY
+from database.ready_pool import (
+    push_ready_item,
+    pop_ready_item,
+    count_ready_items,
+    POOL_QUIZ,
+    POOL_FLASHCARD
+)
+
+# =====================
+# CONFIG
+# =====================
+# Sinh sẵn quiz + flashcard mặc định ngay sau khi index xong → /create trả về tức thì
+# Tắt mặc định: mỗi bộ sinh sẵn là 1 lần gọi LLM dù user có dùng hay không
+PREGEN_ENABLED = os.getenv("PREGEN_ENABLED", "0") == "1"
+PREGEN_POOL_SIZE = int(os.getenv("PREGEN_POOL_SIZE", "1"))       # số bộ / loại / document
+PREGEN_QUIZ_QUESTIONS = int(os.getenv("PREGEN_QUIZ_QUESTIONS", "10"))
+PREGEN_FLASHCARDS = int(os.getenv("PREGEN_FLASHCARDS", "10"))
+
+GENERATORS = {
+    POOL_QUIZ: (
+        lambda source_id: generate_mcq_from_context(
+            document_id=source_id,
+            num_questions=PREGEN_QUIZ_QUESTIONS
+        ),
+        is_fallback_quiz,
+        PREGEN_QUIZ_QUESTIONS
+    ),
+    POOL_FLASHCARD: (
+        # Không qua cache LLM: mỗi bộ trong kho phải là 1 lần sinh mới, không phải bản replay
+        lambda source_id: generate_flashcards_from_context(
+            document_id=source_id,
+            num_cards=PREGEN_FLASHCARDS,
+            cache=False
+        ),
+        is_fallback_cards,
+        PREGEN_FLASHCARDS
+    ),
+}
+
+_queue: "queue.Queue[tuple[int, str] | None]" = queue.Queue()
+_pending = set()
+_worker = None
+_app_loop = None
+_lock = threading.Lock()
+
+
+# =====================
+# NẠP ĐẦY KHO CỦA 1 NGUỒN INDEX
+# =====================
+def _refill(source_id: int, kind: str):
+    generate, is_fallback, size = GENERATORS[kind]
+
+    while count_ready_items(source_id, kind, size) < PREGEN_POOL_SIZE:
+        # Document nguồn có thể đã bị xoá trong khi bản upload trùng vẫn dùng index
+        # → sinh theo 1 document còn sống của nguồn; không còn / đang index lại → bỏ
+        document = get_live_document_for_source(source_id)
+        if document is None or document[1] != INDEX_READY:
+            return
+
+        # Chạy trên event loop của app: AsyncOpenAI client (core.llm) gắn với loop đó,
+        # dùng từ loop khác → "bound to a different event loop"
+        items = asyncio.run_coroutine_threadsafe(generate(document[0]), _app_loop).result()
+        if not items or is_fallback(items):
+            print(f"⚠️ Pregen {kind} source_id={source_id}: không sinh được, bỏ qua")
+            return
+
+        push_ready_item(source_id, kind, items)
+        print(f"✅ Pregen {kind} source_id={source_id}: {len(items)} mục")
+
+
+def _worker_loop():
+    while True:
+        item = _queue.get()
+        if item is None:
+            _queue.task_done()
+            break
+
+        source_id, kind = item
+        try:
+            _refill(source_id, kind)
+        except Exception as e:
+            print(f"❌ Pregen {kind} source_id={source_id} lỗi:", e)
+        finally:
+            with _lock:
+                _pending.discard(item)
+            _queue.task_done()
+
+
+# =====================
+# PUBLIC API
+# =====================
+def schedule_refill(source_id: int, kinds=(POOL_QUIZ, POOL_FLASHCARD)):
+    """
+    Đưa nguồn index vào hàng đợi sinh sẵn (bỏ qua nếu đã có trong hàng đợi)
+    """
+    if not PREGEN_ENABLED:
+        return
+
+    with _lock:
+        for kind in kinds:
+            item = (source_id, kind)
+            if item not in _pending:
+                _pending.add(item)
+                _queue.put(item)
+
+
+def take_ready(document_id: int, kind: str, size: int):
+    """
+    Lấy 1 bộ sinh sẵn (cắt còn size phần tử) rồi nạp lại kho ở nền
+    None → không có sẵn, endpoint tự sinh như bình thường
+    """
+    if not PREGEN_ENABLED:
+        return None
+
+    source_id = get_index_source(document_id)
+    items = pop_ready_item(source_id, kind, size)
+    schedule_refill(source_id, kinds=(kind,))
+    return items[:size] if items else None
+
+
+def start_pregen():
+    """
+    Gọi từ startup của app (trên event loop của app) – refill chạy coroutine trên loop này
+    """
+    global _worker, _app_loop
+    with _lock:
+        if PREGEN_ENABLED and _worker is None:
+            _app_loop = asyncio.get_running_loop()
+            _worker = threading.Thread(target=_worker_loop, name="pregen", daemon=True)
+            _worker.start()
+            print(f"✅ Pregen worker started: {PREGEN_POOL_SIZE} bộ / loại / document")
+
+
+def stop_pregen():
+    global _worker
+    with _lock:
+        if _worker is not None:
+            _queue.put(None)
+            _worker = None
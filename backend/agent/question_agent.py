@@ -1,11 +1,34 @@
-from core.llm import client
-from rag.rag_tool import retrieve_context_by_document
-import json
+from core.llm import stream_chat_completion
+from core.json_stream import JSONArrayStream, aiter_json_items
+from core.tokens import count_tokens, context_budget
+from rag.rag_tool import aretrieve_chunks_by_document, pack_chunks
+from rag.text_splitter import split_text
+from rag.query_embeddings import register_static_query
+import asyncio
+import math
 import random
-from typing import List, Dict
+import re
+from typing import AsyncIterator, List, Dict
 
+# =====================
+# CONFIG
+# =====================
+QUESTIONS_PER_CALL = 5        # mỗi lời gọi LLM sinh tối đa 5 câu
+MAX_PARALLEL_CALLS = 6        # số lời gọi chạy đồng thời cho 1 quiz
+CALL_TOKEN_BUDGET = 2500      # mỗi lời gọi: prompt + ngữ cảnh + output
+OUTPUT_TOKENS_PER_QUESTION = 120
+TOP_UP_ROUNDS = 2             # số vòng sinh bù khi thiếu câu (lỗi JSON / trùng)
+AVOID_TOKENS = 400            # phần prompt dành cho danh sách câu đã có khi sinh bù
+OPTION_KEYS = ("A", "B", "C", "D")
+
+# Query cố định → embedding được tính sẵn lúc startup
+QUIZ_QUERY = register_static_query("""
+            Khái niệm cốt lõi, định nghĩa, nguyên lý,
+            kiến thức trọng tâm dùng để ôn thi
+            """)
 
-def generate_mcq_from_context(
+
+async def generate_mcq_from_context(
     document_id: int,
     document_text: str | None = None,
     num_questions: int = 10
@@ -14,31 +37,142 @@ def generate_mcq_from_context(
     Sinh câu hỏi trắc nghiệm ôn tập bằng RAG
     → GẮN CHẶT THEO document_id
     """
+    quiz = [
+        question async for question in stream_mcq_from_context(
+            document_id, document_text, num_questions
+        )
+    ]
+
+    if not quiz:
+        return _fallback_quiz(num_questions)
+
+    if len(quiz) < num_questions:
+        print(f"⚠️ Quiz: chỉ sinh được {len(quiz)}/{num_questions} câu")
+
+    return quiz
+
+
+async def stream_mcq_from_context(
+    document_id: int,
+    document_text: str | None = None,
+    num_questions: int = 10
+) -> AsyncIterator[Dict]:
+    """
+    Yield từng câu hỏi (đã kiểm tra, bỏ trùng) ngay khi 1 lời gọi bất kỳ viết xong câu đó
+
+    Fan-out: chia thành nhiều lời gọi song song (mỗi lời gọi ≤ QUESTIONS_PER_CALL câu,
+    trên 1 phần ngữ cảnh khác nhau) → gộp, kiểm tra, bỏ trùng, sinh bù phần thiếu
+    → 30 câu mất xấp xỉ thời gian 10 câu, 1 lời gọi lỗi không làm hỏng cả quiz
+    """
+    calls = math.ceil(num_questions / QUESTIONS_PER_CALL)
+    slice_tokens = context_budget(
+        CALL_TOKEN_BUDGET,
+        count_tokens(_build_prompt("", QUESTIONS_PER_CALL, [])) + AVOID_TOKENS,
+        QUESTIONS_PER_CALL * OUTPUT_TOKENS_PER_QUESTION
+    )
 
     # =====================
-    # 1️⃣ GET CONTEXT (RAG)
+    # 1️⃣ GET CONTEXT (RAG) → CHIA THÀNH CÁC PHẦN THEO TOKEN
     # =====================
     if document_text and document_text.strip():
-        context = document_text
+        chunks = split_text(document_text)
     else:
-        context = retrieve_context_by_document(
+        chunks = await aretrieve_chunks_by_document(
             document_id=document_id,
-            query="""
-            Khái niệm cốt lõi, định nghĩa, nguyên lý,
-            kiến thức trọng tâm dùng để ôn thi
-            """,
-            k=10
+            query=QUIZ_QUERY,
+            k=max(10, calls * 4),
+            max_tokens=calls * slice_tokens
         )
 
-    if not context:
-        return _fallback_quiz(num_questions)
+    if not chunks:
+        return
 
-    context = context[:6000]
+    slices = _make_slices(chunks, calls, slice_tokens)
 
     # =====================
-    # 2️⃣ PROMPT
+    # 2️⃣ FAN-OUT + GỘP + SINH BÙ
     # =====================
-    prompt = f"""
+    quiz: List[Dict] = []
+    seen = set()
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_CALLS)
+
+    for round_no in range(1 + TOP_UP_ROUNDS):
+        missing = num_questions - len(quiz)
+        if missing <= 0:
+            break
+
+        sizes = [QUESTIONS_PER_CALL] * (missing // QUESTIONS_PER_CALL)
+        if missing % QUESTIONS_PER_CALL:
+            sizes.append(missing % QUESTIONS_PER_CALL)
+
+        avoid = _avoid_list(quiz)
+        batches = [
+            _stream_batch(
+                # vòng sinh bù lệch phần ngữ cảnh → ít trùng với vòng trước
+                slices[(i + round_no) % len(slices)],
+                size,
+                avoid,
+                semaphore
+            )
+            for i, size in enumerate(sizes)
+        ]
+
+        async for question in _merge(batches):
+            key = _question_key(question["question"])
+            if key in seen:
+                continue
+            seen.add(key)
+            quiz.append(question)
+            yield question
+
+            if len(quiz) >= num_questions:
+                return
+
+
+async def _merge(streams: List[AsyncIterator[Dict]]) -> AsyncIterator[Dict]:
+    """
+    Gộp nhiều stream chạy song song → yield theo thứ tự câu nào xong trước
+    Dừng sớm (đủ câu / client ngắt) → huỷ các lời gọi còn đang chạy
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(stream):
+        try:
+            async for item in stream:
+                queue.put_nowait(item)
+        finally:
+            queue.put_nowait(None)
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    running = len(tasks)
+
+    try:
+        while running:
+            item = await queue.get()
+            if item is None:
+                running -= 1
+                continue
+            yield item
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# =====================
+# 1 LỜI GỌI LLM
+# =====================
+def _build_prompt(context: str, num_questions: int, avoid: List[str]) -> str:
+    avoid_block = ""
+    if avoid:
+        listed = "\n".join(f"- {q}" for q in avoid)
+        avoid_block = f"""
+KHÔNG lặp lại các câu hỏi đã có:
+{listed}
+"""
+
+    return f"""
 Bạn là AI hỗ trợ ôn tập cho sinh viên.
 
 CHỈ sử dụng thông tin trong tài liệu bên dưới.
@@ -52,20 +186,22 @@ NHIỆM VỤ:
 YÊU CẦU:
 - Tập trung định nghĩa, nguyên lý
 - Phù hợp ôn thi
-
-CHỈ TRẢ VỀ JSON THUẦN:
-[
-  {{
-    "question": "...",
-    "options": {{
-      "A": "...",
-      "B": "...",
-      "C": "...",
-      "D": "..."
-    }},
-    "correct_answer": "A"
-  }}
-]
+{avoid_block}
+CHỈ TRẢ VỀ JSON OBJECT:
+{{
+  "questions": [
+    {{
+      "question": "...",
+      "options": {{
+        "A": "...",
+        "B": "...",
+        "C": "...",
+        "D": "..."
+      }},
+      "correct_answer": "A"
+    }}
+  ]
+}}
 
 TÀI LIỆU:
 \"\"\"
@@ -73,36 +209,132 @@ TÀI LIỆU:
 \"\"\"
 """
 
-    # =====================
-    # 3️⃣ CALL LLM
-    # =====================
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-
-        raw = response.choices[0].message.content.strip()
 
-        if raw.startswith("```"):
-            raw = raw.replace("```json", "").replace("```", "").strip()
+async def _stream_batch(
+    context: str,
+    num_questions: int,
+    avoid: List[str],
+    semaphore: asyncio.Semaphore
+) -> AsyncIterator[Dict]:
+    """
+    Yield từng câu hợp lệ ngay khi parse xong
+    Lỗi (API / JSON hỏng / bị cắt) chỉ làm mất phần chưa sinh của lời gọi này
+    """
+    parser = JSONArrayStream()
+    count = 0
 
-        quiz = json.loads(raw)
+    try:
+        async with semaphore:
+            # Không cache: mỗi lần tạo quiz nên ra bộ câu hỏi khác
+            tokens = stream_chat_completion(
+                messages=[{"role": "user", "content": _build_prompt(context, num_questions, avoid)}],
+                temperature=0.3,
+                agent="quiz",
+                response_format={"type": "json_object"}
+            )
+            try:
+                async for item in aiter_json_items(tokens, parser):
+                    # đủ câu → không yield nữa nhưng vẫn đọc hết stream (usage ở chunk cuối)
+                    if count >= num_questions:
+                        continue
 
-        if not isinstance(quiz, list):
-            raise ValueError("Output is not list")
+                    question = _validate_question(item)
+                    if not question:
+                        parser.skipped += 1
+                        continue
 
-        return quiz[:num_questions]
+                    yield question
+                    count += 1
+            finally:
+                await tokens.aclose()
 
     except Exception as e:
         print("❌ QUIZ GENERATION ERROR:", e)
-        return _fallback_quiz(num_questions)
+
+    if parser.skipped:
+        print(f"⚠️ Quiz: bỏ {parser.skipped} câu lỗi, giữ {count} câu")
+
+
+# =====================
+# KIỂM TRA / BỎ TRÙNG
+# =====================
+def _validate_question(item) -> Dict | None:
+    """
+    Câu hợp lệ: có question, đủ 4 phương án A–D không rỗng, đáp án thuộc A–D
+    """
+    if not isinstance(item, dict):
+        return None
+
+    question = item.get("question")
+    options = item.get("options")
+    answer = item.get("correct_answer")
+
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if not isinstance(options, dict):
+        return None
+
+    options = {k.strip().upper(): v for k, v in options.items() if isinstance(k, str)}
+    if not all(isinstance(options.get(k), str) and options[k].strip() for k in OPTION_KEYS):
+        return None
+
+    if not isinstance(answer, str) or answer.strip().upper() not in OPTION_KEYS:
+        return None
+
+    return {
+        "question": question.strip(),
+        "options": {k: options[k].strip() for k in OPTION_KEYS},
+        "correct_answer": answer.strip().upper()
+    }
+
+
+def _avoid_list(quiz: List[Dict]) -> List[str]:
+    """
+    Các câu gần nhất đã có, vừa AVOID_TOKENS
+    """
+    avoid = []
+    used = 0
+    for q in reversed(quiz):
+        used += count_tokens(q["question"]) + 2
+        if used > AVOID_TOKENS:
+            break
+        avoid.append(q["question"])
+    return avoid[::-1]
+
+
+def _question_key(question: str) -> str:
+    # bỏ dấu câu / khoảng trắng / hoa thường → "Mạng là gì?" ≡ "mạng là gì"
+    return " ".join(re.findall(r"\w+", question.casefold()))
+
+
+# =====================
+# CHIA NGỮ CẢNH
+# =====================
+def _make_slices(chunks: List[str], count: int, max_tokens: int) -> List[str]:
+    """
+    Chia chunk xoay vòng vào count phần, mỗi phần ≤ max_tokens (cắt theo chunk, không cắt giữa câu)
+    Ít chunk hơn số phần → các phần dùng lại chunk (lệch vị trí bắt đầu)
+    """
+    count = max(1, count)
+    slices = []
+    for i in range(count):
+        candidates = chunks[i::count] or [chunks[i % len(chunks)]]
+        picked, _ = pack_chunks(
+            candidates,
+            [count_tokens(chunk) for chunk in candidates],
+            max_tokens
+        )
+        slices.append("\n\n".join(picked or candidates[:1]))
+    return slices
 
 
 # =====================
 # FALLBACK (CHỈ DÙNG KHI RAG FAIL)
 # =====================
+def is_fallback_quiz(quiz: List[Dict]) -> bool:
+    return bool(quiz) and quiz[0]["options"]["A"] == "Đáp án A"
+
+
 def _fallback_quiz(n: int) -> List[Dict]:
     options_keys = ["A", "B", "C", "D"]
     quiz = []
@@ -1,6 +1,6 @@
-from core.llm import client
+from core.llm import achat_completion
 
-def generate_study_plan(topics: list):
+async def generate_study_plan(topics: list):
     topic_text = "\n".join(topics)
 
     prompt = f"""
@@ -15,9 +15,8 @@ CHỦ ĐỀ:
 {topic_text}
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
+    return await achat_completion(
+        messages=[{"role": "user", "content": prompt}],
+        cache=True,
+        agent="study_plan"
     )
-
-    return response.choices[0].message.content
@@ -0,0 +1,109 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+
+from api.sse import sse_event, sse_response
+from core.llm import stream_chat_completion
+from database.document import (
+    get_document_status,
+    get_index_source,
+    is_document_owner,
+    INDEX_READY
+)
+from database.page_text import find_page
+from rag.rag_tool import (
+    aretrieve_answer_chunks,
+    build_answer_messages,
+    RAG_ANSWER_TEMPERATURE,
+    NO_ANSWER_MESSAGE
+)
+
+router = APIRouter(prefix="/chat", tags=["Chat"])
+
+CITATION_PREVIEW_CHARS = 200
+
+
+# ======================
+# SCHEMAS
+# ======================
+class ChatRequest(BaseModel):
+    user_id: int = Field(..., gt=0)
+    question: str = Field(..., min_length=1)
+
+
+# ======================
+# CITATIONS
+# ======================
+def _citations(document_id: int, chunks):
+    source_id = get_index_source(document_id)
+    return [
+        {
+            "id": i + 1,
+            "page": find_page(source_id, chunk),
+            "text": chunk[:CITATION_PREVIEW_CHARS]
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+# ======================
+# CHAT (RAG – STREAM TỪNG TOKEN)
+# ======================
+@router.post("/{document_id}")
+async def chat_with_document(document_id: int, data: ChatRequest, request: Request):
+    """
+    Trả lời câu hỏi theo tài liệu, stream qua Server-Sent Events:
+    - event: citations → các chunk ngữ cảnh (kèm số trang) – gửi trước
+    - event: token     → từng đoạn câu trả lời
+    - event: done / error
+    Client đóng kết nối → dừng stream và huỷ request tới OpenAI
+    """
+    if not await asyncio.to_thread(is_document_owner, document_id, data.user_id):
+        raise HTTPException(
+            status_code=404,
+            detail="❌ Document không tồn tại hoặc không có quyền truy cập"
+        )
+
+    status = await asyncio.to_thread(get_document_status, document_id)
+    if status != INDEX_READY:
+        raise HTTPException(
+            status_code=409,
+            detail=f"⏳ Tài liệu chưa index xong (index_status={status})"
+        )
+
+    chunks = await aretrieve_answer_chunks(data.question, document_id)
+    citations = await asyncio.to_thread(_citations, document_id, chunks)
+
+    async def event_stream():
+        yield sse_event("citations", citations)
+
+        if not chunks:
+            yield sse_event("token", {"text": NO_ANSWER_MESSAGE})
+            yield sse_event("done", {})
+            return
+
+        tokens = stream_chat_completion(
+            messages=build_answer_messages(data.question, "\n\n".join(chunks)),
+            temperature=RAG_ANSWER_TEMPERATURE,
+            cache=True,
+            agent="chat"
+        )
+        try:
+            async for text in tokens:
+                if await request.is_disconnected():
+                    print(f"⚠️ Chat document_id={document_id}: client ngắt kết nối")
+                    return
+                yield sse_event("token", {"text": text})
+
+            yield sse_event("done", {})
+
+        except Exception as e:
+            print("❌ Chat stream error:", e)
+            yield sse_event("error", {"detail": "❌ Lỗi khi sinh câu trả lời"})
+
+        finally:
+            # đóng generator → đóng stream OpenAI (huỷ request nếu còn đang chạy)
+            await tokens.aclose()
+
+    return sse_response(event_stream())
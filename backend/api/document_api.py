@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from database.document import (
     get_documents_by_user,
-    delete_document
+    delete_document,
+    get_index_source,
+    is_document_owner
 )
+from database.page_text import search_pages
+from rag.reaper import enqueue_reap
 
 router = APIRouter(
     prefix="/documents",
@@ -24,7 +28,8 @@ def list_user_documents(user_id: int):
         {
             "id": d[0],
             "filename": d[1],
-            "created_at": d[2]
+            "created_at": d[2],
+            "index_status": d[3]
         }
         for d in docs
     ]
@@ -38,12 +43,50 @@ def remove_document(document_id: int, user_id: int):
     """
     Xóa document theo id (chỉ owner mới xóa được)
     """
-    success = delete_document(document_id, user_id)
+    result = delete_document(document_id, user_id)
 
-    if not success:
+    if not result:
         raise HTTPException(
             status_code=404,
             detail="❌ Document không tồn tại hoặc không có quyền xóa"
         )
 
+    # Không còn document nào dùng file này → dọn chunk + file ở nền
+    if result["released"]:
+        enqueue_reap(
+            document_id,
+            source_id=result["source_id"],
+            filepath=result["filepath"]
+        )
+
     return {"message": "🗑️ Document deleted successfully"}
+
+
+# =========================
+# TÌM KIẾM TỪ KHOÁ TRONG DOCUMENT (FTS5 / BM25)
+# =========================
+@router.get("/{document_id}/search")
+def search_document(
+    document_id: int,
+    user_id: int,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    """
+    Tìm theo từ khoá trên text từng trang (không gọi embedding API)
+    Hỗ trợ gõ không dấu: "dinh nghia" ↔ "định nghĩa"
+    """
+    if not is_document_owner(document_id, user_id):
+        raise HTTPException(
+            status_code=404,
+            detail="❌ Document không tồn tại hoặc không có quyền truy cập"
+        )
+
+    results = search_pages(get_index_source(document_id), q, limit=limit)
+
+    return {
+        "document_id": document_id,
+        "query": q,
+        "total": len(results),
+        "results": results
+    }
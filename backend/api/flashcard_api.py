@@ -1,18 +1,36 @@
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+from pathlib import Path
+
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
-from agent.flashcard_agent import generate_flashcards_from_context
+from agent.flashcard_agent import generate_flashcards_from_context, stream_flashcards_from_context
+from agent.pregen import take_ready, PREGEN_ENABLED
+from api.sse import sse_event, sse_response
+from database.ready_pool import POOL_FLASHCARD
+from database.document import get_document_status, is_document_owner, INDEX_READY
 from database.flashcard import (
     save_flashcard_set,
+    import_flashcard_set,
+    iter_flashcard_export,
     get_all_flashcard_sets,
     get_flashcard_set_by_id,
     delete_flashcard_set
 )
+from utils.deck_io import DeckReader, detect_format, iter_export_chunks, DECK_FORMATS, EXPORT_FORMATS
 
 router = APIRouter(prefix="/flashcard", tags=["Flashcard"])
 
+# ===================== CONFIG =====================
+MAX_IMPORT_CARDS = 20000
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8"
+}
+
 
 # =====================
 # SCHEMA
@@ -37,21 +55,49 @@ class FlashcardCreateResponse(BaseModel):
 
 
 # =====================
-# CREATE FLASHCARD (RAG – THEO FILE)
+# KIỂM TRA REQUEST
 # =====================
-@router.post("/create", response_model=FlashcardCreateResponse)
-def create_flashcard(data: FlashcardCreateRequest):
+async def _validate_request(data: FlashcardCreateRequest) -> str:
+    """
+    Trả về title – lỗi → HTTPException
+    """
+    # ===== DOCUMENT PHẢI INDEX XONG =====
+    status = await asyncio.to_thread(get_document_status, data.document_id)
+    if status is None:
+        raise HTTPException(
+            status_code=404,
+            detail="❌ Document không tồn tại"
+        )
+    if status != INDEX_READY:
+        raise HTTPException(
+            status_code=409,
+            detail=f"⏳ Tài liệu chưa index xong (index_status={status})"
+        )
 
     # ===== AUTO TITLE NẾU KHÔNG CÓ =====
     title = data.title
     if not title:
         title = f"Flashcard - Document {data.document_id} - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
 
-    # ===== GENERATE FLASHCARDS =====
-    cards = generate_flashcards_from_context(
-        document_id=data.document_id,
-        num_cards=data.num_cards
-    )
+    return title
+
+
+# =====================
+# CREATE FLASHCARD (RAG – THEO FILE)
+# =====================
+@router.post("/create", response_model=FlashcardCreateResponse)
+async def create_flashcard(data: FlashcardCreateRequest):
+    title = await _validate_request(data)
+
+    # ===== GENERATE FLASHCARDS (ƯU TIÊN BỘ SINH SẴN) =====
+    cards = await asyncio.to_thread(take_ready, data.document_id, POOL_FLASHCARD, data.num_cards)
+    if cards is None:
+        # Có kho sinh sẵn → không dùng cache LLM (kho rỗng thì phải ra bộ thẻ mới)
+        cards = await generate_flashcards_from_context(
+            document_id=data.document_id,
+            num_cards=data.num_cards,
+            cache=not PREGEN_ENABLED
+        )
 
     if not cards:
         raise HTTPException(
@@ -60,7 +106,8 @@ def create_flashcard(data: FlashcardCreateRequest):
         )
 
     # ===== SAVE FLASHCARD SET =====
-    set_id = save_flashcard_set(
+    set_id = await asyncio.to_thread(
+        save_flashcard_set,
         user_id=data.user_id,
         document_id=data.document_id,
         title=title,
@@ -81,6 +128,168 @@ def create_flashcard(data: FlashcardCreateRequest):
     }
 
 
+# =====================
+# CREATE FLASHCARD – STREAM TỪNG THẺ (SSE)
+# =====================
+@router.post("/stream")
+async def stream_flashcard(data: FlashcardCreateRequest, request: Request):
+    """
+    Như /create nhưng gửi từng thẻ ngay khi sinh xong, qua Server-Sent Events:
+    - event: item  → 1 flashcard
+    - event: done  → {set_id, total_cards} (bộ thẻ đã lưu)
+    - event: error
+    Client ngắt kết nối → dừng sinh, không lưu bộ thẻ
+    """
+    title = await _validate_request(data)
+
+    async def event_stream():
+        cards = await asyncio.to_thread(take_ready, data.document_id, POOL_FLASHCARD, data.num_cards)
+
+        if cards is not None:
+            for card in cards:
+                yield sse_event("item", card)
+        else:
+            cards = []
+            generator = stream_flashcards_from_context(
+                document_id=data.document_id,
+                num_cards=data.num_cards,
+                cache=not PREGEN_ENABLED
+            )
+            try:
+                async for card in generator:
+                    if await request.is_disconnected():
+                        print(f"⚠️ Flashcard stream document_id={data.document_id}: client ngắt kết nối")
+                        return
+                    cards.append(card)
+                    yield sse_event("item", card)
+
+            except Exception as e:
+                print("❌ Flashcard stream error:", e)
+
+            finally:
+                await generator.aclose()
+
+        if not cards:
+            yield sse_event("error", {"detail": "❌ Không tạo được flashcard từ tài liệu"})
+            return
+
+        set_id = await asyncio.to_thread(
+            save_flashcard_set,
+            user_id=data.user_id,
+            document_id=data.document_id,
+            title=title,
+            cards=cards
+        )
+
+        if not set_id:
+            yield sse_event("error", {"detail": "❌ Lỗi lưu flashcard vào database"})
+            return
+
+        yield sse_event("done", {"set_id": set_id, "total_cards": len(cards)})
+
+    return sse_response(event_stream())
+
+
+# =====================
+# IMPORT DECK (CSV / JSON / NDJSON)
+# =====================
+def _import_deck(file, fmt, user_id, document_id, title):
+    reader = DeckReader(file, fmt)
+    set_id, total = import_flashcard_set(
+        user_id=user_id,
+        document_id=document_id,
+        title=title,
+        cards=reader,
+        max_cards=MAX_IMPORT_CARDS
+    )
+    return set_id, total, reader.skipped
+
+
+@router.post("/import")
+async def import_flashcards(
+    file: UploadFile = File(...),
+    user_id: int = Form(..., gt=0),
+    document_id: int = Form(..., gt=0),
+    title: Optional[str] = Form(None),
+    format: Optional[str] = Form(None)
+):
+    """
+    Import 1 deck lớn thành 1 bộ flashcard
+    - CSV: dòng tiêu đề có cột question, answer (hoặc front, back)
+    - JSON: mảng [{question, answer}] hoặc {"cards": [...]}
+    - NDJSON: mỗi dòng 1 object
+    File đọc theo đoạn + ghi theo lô trong 1 transaction (lỗi → không ghi gì)
+    """
+    fmt = detect_format(file.filename, format)
+    if fmt is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"❌ Chỉ hỗ trợ {', '.join(DECK_FORMATS)}"
+        )
+
+    if not await asyncio.to_thread(is_document_owner, document_id, user_id):
+        raise HTTPException(
+            status_code=404,
+            detail="❌ Document không tồn tại hoặc không có quyền truy cập"
+        )
+
+    title = title or Path(file.filename or "").stem or f"Import - Document {document_id}"
+
+    try:
+        set_id, total, skipped = await asyncio.to_thread(
+            _import_deck, file.file, fmt, user_id, document_id, title
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print("❌ Import flashcard error:", e)
+        raise HTTPException(
+            status_code=500,
+            detail="❌ Lỗi lưu flashcard vào database"
+        )
+
+    return {
+        "message": "✅ Flashcard imported successfully",
+        "set_id": set_id,
+        "total_cards": total,
+        "skipped": skipped
+    }
+
+
+# =====================
+# EXPORT MỌI BỘ THẺ CỦA DOCUMENT (NDJSON / CSV, STREAM)
+# =====================
+@router.get("/export/{user_id}")
+def export_flashcards(
+    user_id: int,
+    document_id: int = Query(..., gt=0),
+    format: str = Query("ndjson")
+):
+    """
+    Stream theo lô từ DB ra response – không dựng cả deck trong RAM
+    (generator đồng bộ → Starlette chạy trong threadpool, không chặn event loop)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"❌ format phải là {' | '.join(EXPORT_FORMATS)}"
+        )
+
+    if not is_document_owner(document_id, user_id):
+        raise HTTPException(
+            status_code=404,
+            detail="❌ Document không tồn tại hoặc không có quyền truy cập"
+        )
+
+    return StreamingResponse(
+        iter_export_chunks(iter_flashcard_export(user_id, document_id), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="flashcards-document-{document_id}.{format}"'
+        }
+    )
+
+
 # =====================
 # LIST FLASHCARD SETS (THEO DOCUMENT)
 # =====================
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 from datetime import datetime
 
-from agent.question_agent import generate_mcq_from_context
+from agent.question_agent import generate_mcq_from_context, stream_mcq_from_context
+from agent.pregen import take_ready
+from api.sse import sse_event, sse_response
+from database.ready_pool import POOL_QUIZ
+from database.document import get_document_status, INDEX_READY
 from database.quiz import (
     save_quiz,
     get_all_quizzes,
@@ -38,11 +44,12 @@ class QuizCreateResponse(BaseModel):
 
 
 # ======================
-# CREATE QUIZ (RAG – THEO FILE)
+# KIỂM TRA REQUEST
 # ======================
-@router.post("/create", response_model=QuizCreateResponse)
-def create_quiz(data: QuizCreateRequest):
-
+async def _validate_request(data: QuizCreateRequest):
+    """
+    Trả về (num_questions, title) – lỗi → HTTPException
+    """
     # ===== VALIDATE SỐ CÂU =====
     num_questions = data.num_questions or 10
     if num_questions <= 0:
@@ -51,16 +58,41 @@ def create_quiz(data: QuizCreateRequest):
             detail="❌ num_questions phải > 0"
         )
 
+    # ===== DOCUMENT PHẢI INDEX XONG =====
+    status = await asyncio.to_thread(get_document_status, data.document_id)
+    if status is None:
+        raise HTTPException(
+            status_code=404,
+            detail="❌ Document không tồn tại"
+        )
+    if status != INDEX_READY:
+        raise HTTPException(
+            status_code=409,
+            detail=f"⏳ Tài liệu chưa index xong (index_status={status})"
+        )
+
     # ===== TỰ SINH TITLE NẾU KHÔNG CÓ =====
     title = data.title
     if not title:
         title = f"Quiz - Document {data.document_id} - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
 
-    # ===== SINH CÂU HỎI =====
-    questions = generate_mcq_from_context(
-        document_id=data.document_id,
-        num_questions=num_questions
-    )
+    return num_questions, title
+
+
+# ======================
+# CREATE QUIZ (RAG – THEO FILE)
+# ======================
+@router.post("/create", response_model=QuizCreateResponse)
+async def create_quiz(data: QuizCreateRequest):
+    num_questions, title = await _validate_request(data)
+
+    # ===== SINH CÂU HỎI (ƯU TIÊN BỘ SINH SẴN) =====
+    questions = await asyncio.to_thread(take_ready, data.document_id, POOL_QUIZ, num_questions)
+    if questions is None:
+        questions = await generate_mcq_from_context(
+            document_id=data.document_id,
+            num_questions=num_questions
+        )
 
     if not questions:
         raise HTTPException(
@@ -69,7 +101,8 @@ def create_quiz(data: QuizCreateRequest):
         )
 
     # ===== LƯU QUIZ =====
-    quiz_id = save_quiz(
+    quiz_id = await asyncio.to_thread(
+        save_quiz,
         user_id=data.user_id,
         title=title,
         questions=questions,
@@ -90,6 +123,67 @@ def create_quiz(data: QuizCreateRequest):
     }
 
 
+# ======================
+# CREATE QUIZ – STREAM TỪNG CÂU (SSE)
+# ======================
+@router.post("/stream")
+async def stream_quiz(data: QuizCreateRequest, request: Request):
+    """
+    Như /create nhưng gửi từng câu ngay khi sinh xong, qua Server-Sent Events:
+    - event: item  → 1 câu hỏi
+    - event: done  → {quiz_id, total_questions} (quiz đã lưu)
+    - event: error
+    Client ngắt kết nối → dừng sinh, không lưu quiz
+    """
+    num_questions, title = await _validate_request(data)
+
+    async def event_stream():
+        questions = await asyncio.to_thread(take_ready, data.document_id, POOL_QUIZ, num_questions)
+
+        if questions is not None:
+            for question in questions:
+                yield sse_event("item", question)
+        else:
+            questions = []
+            generator = stream_mcq_from_context(
+                document_id=data.document_id,
+                num_questions=num_questions
+            )
+            try:
+                async for question in generator:
+                    if await request.is_disconnected():
+                        print(f"⚠️ Quiz stream document_id={data.document_id}: client ngắt kết nối")
+                        return
+                    questions.append(question)
+                    yield sse_event("item", question)
+
+            except Exception as e:
+                print("❌ Quiz stream error:", e)
+
+            finally:
+                await generator.aclose()
+
+        if not questions:
+            yield sse_event("error", {"detail": "❌ Không tạo được câu hỏi trắc nghiệm"})
+            return
+
+        quiz_id = await asyncio.to_thread(
+            save_quiz,
+            user_id=data.user_id,
+            title=title,
+            questions=questions,
+            document_id=data.document_id
+        )
+
+        if not quiz_id:
+            yield sse_event("error", {"detail": "❌ Lỗi lưu quiz vào database"})
+            return
+
+        yield sse_event("done", {"quiz_id": quiz_id, "total_questions": len(questions)})
+
+    return sse_response(event_stream())
+
+
 # ======================
 # LIST QUIZ (THEO FILE)
 # ======================
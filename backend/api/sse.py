@@ -0,0 +1,22 @@
+import json
+
+from fastapi.responses import StreamingResponse
+
+
+# ======================
+# SERVER-SENT EVENTS (DÙNG CHUNG CÁC ENDPOINT STREAM)
+# ======================
+def sse_event(event: str, data) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from pathlib import Path
-import pdfplumber
-import shutil
+import asyncio
+import hashlib
+import os
 import uuid
 
-from rag.indexer import index_document
-from database.document import save_document
+from rag.ingest_queue import enqueue_ingest
+from database.document import save_document_dedup
+from database.ingest_job import get_ingest_job, get_latest_ingest_job_id
 
 router = APIRouter(
     prefix="/upload",
@@ -15,6 +17,13 @@ router = APIRouter(
 # ===================== CONFIG =====================
 UPLOAD_DIR = Path("backend/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB / lần đọc
+
+
+def _write_chunk(buffer, sha256, chunk: bytes):
+    sha256.update(chunk)
+    buffer.write(chunk)
+
 
 # ===================== UPLOAD PDF =====================
 @router.post("/pdf")
@@ -24,54 +33,87 @@ async def upload_pdf(
 ):
     """
     Upload PDF
-    → save file
-    → save DB (documents)
-    → extract text
-    → index RAG (THEO document_id)
+    → stream file xuống disk + tính sha256
+    → lưu theo nội dung: backend/uploads/{sha256}.pdf
+    → file trùng: dùng lại chunk đã index (không extract / embed lại)
+    → file mới: đẩy job index vào hàng đợi, theo dõi qua /upload/jobs/{job_id}
     """
 
     # 1️⃣ Validate file
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="❌ Chỉ hỗ trợ file PDF")
 
+    tmp_path = UPLOAD_DIR / f"{uuid.uuid4()}.part"
+
     try:
-        # 2️⃣ Tạo tên file không trùng
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}_{file.filename}"
-        file_path = UPLOAD_DIR / filename
-
-        # 3️⃣ Lưu file vào disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # 4️⃣ Trích xuất text từ PDF
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="❌ PDF không có nội dung")
-
-        # 5️⃣ Lưu document vào database
-        document_id = save_document(
+        # 2️⃣ Stream file vào disk, hash song song
+        # (hash + ghi disk chạy ở thread riêng → không chặn event loop)
+        sha256 = hashlib.sha256()
+        buffer = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(_write_chunk, buffer, sha256, chunk)
+        finally:
+            await asyncio.to_thread(buffer.close)
+
+        content_hash = sha256.hexdigest()
+        file_path = UPLOAD_DIR / f"{content_hash}.pdf"
+
+        # 3️⃣ Lưu document (dedup theo content_hash)
+        document_id, source_id, index_status, is_new_source = await asyncio.to_thread(
+            save_document_dedup,
             user_id=user_id,
             filename=file.filename,
-            filepath=str(file_path)
+            filepath=str(file_path),
+            content_hash=content_hash
         )
 
-        # 6️⃣ Index RAG (🔥 TRUYỀN document_id)
-        total_chunks = index_document(
-            text=text,
-            document_id=document_id
+        if not is_new_source:
+            # File đã có → chỉ thêm metadata
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+            return {
+                "message": "✅ Upload thành công – dùng lại tài liệu đã index",
+                "document_id": document_id,
+                "job_id": await asyncio.to_thread(get_latest_ingest_job_id, source_id),
+                "filename": file.filename,
+                "index_status": index_status,
+                "deduplicated": True
+            }
+
+        await asyncio.to_thread(os.replace, tmp_path, file_path)
+
+        # 4️⃣ Đẩy job index vào hàng đợi (🔥 TRUYỀN document_id)
+        job_id = str(uuid.uuid4())
+        await asyncio.to_thread(
+            enqueue_ingest,
+            job_id=job_id,
+            document_id=document_id,
+            filepath=str(file_path)
         )
 
         return {
-            "message": "✅ Upload & lưu tài liệu thành công",
+            "message": "✅ Upload thành công – tài liệu đang được index",
             "document_id": document_id,
+            "job_id": job_id,
             "filename": file.filename,
-            "total_chunks": total_chunks
+            "index_status": index_status,
+            "deduplicated": False
         }
 
     except Exception as e:
+        tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ===================== JOB STATUS =====================
+@router.get("/jobs/{job_id}")
+def get_upload_job(job_id: str):
+    """
+    Trạng thái job index: stage + progress (0 → 1)
+    """
+    job = get_ingest_job(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="❌ Job not found")
+
+    return job
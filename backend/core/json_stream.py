@@ -0,0 +1,88 @@
+import json
+from typing import AsyncIterator, List
+
+
+# =====================
+# PARSE MẢNG JSON TĂNG DẦN
+# =====================
+class JSONArrayStream:
+    """
+    Parser tăng dần cho mảng JSON các object (flashcard, câu hỏi, ...)
+    feed(text) → các object vừa đóng ngoặc xong, không chờ cả câu trả lời
+
+    - Bỏ qua mọi thứ trước dấu [ đầu tiên (ngoài chuỗi) → nhận cả {"cards": [...]}
+      (JSON mode), mảng trần [...] lẫn ```json ... ```
+    - 1 object hỏng chỉ mất object đó (skipped += 1), các object khác vẫn giữ
+    - Output bị cắt giữa chừng → giữ các object đã hoàn chỉnh trước đó
+    """
+
+    def __init__(self):
+        self.done = False
+        self.skipped = 0
+        self._started = False
+        self._depth = 0            # độ sâu {} / [] bên trong mảng ngoài cùng
+        self._in_string = False
+        self._escape = False
+        self._buffer = None        # ký tự của object đang đọc (None = không đọc)
+
+    def feed(self, text: str) -> List:
+        items = []
+
+        for ch in text:
+            if self.done:
+                break
+
+            if self._buffer is not None:
+                self._buffer.append(ch)
+
+            # theo dõi chuỗi cả trước khi vào mảng → dấu [ nằm trong chuỗi không bị nhận nhầm
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+
+            elif not self._started:
+                self._started = ch == "["
+
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._buffer = [ch]
+                self._depth += 1
+
+            elif ch in "}]":
+                if self._depth == 0:
+                    # ] đóng mảng ngoài cùng → phần sau (nếu có) bỏ qua
+                    self.done = True
+                    break
+
+                self._depth -= 1
+                if self._depth == 0 and self._buffer is not None:
+                    raw = "".join(self._buffer)
+                    self._buffer = None
+                    try:
+                        items.append(json.loads(raw))
+                    except ValueError:
+                        self.skipped += 1
+
+        return items
+
+
+async def aiter_json_items(chunks: AsyncIterator[str], parser: JSONArrayStream | None = None) -> AsyncIterator:
+    """
+    Nhận các đoạn text từ stream LLM → yield từng phần tử của mảng JSON ngay khi đủ
+    Mảng đóng rồi vẫn đọc tiếp tới hết stream (không feed) → stream LLM kịp ghi cache + usage
+    """
+    parser = parser or JSONArrayStream()
+    async for chunk in chunks:
+        if parser.done:
+            continue
+        for item in parser.feed(chunk):
+            yield item
+
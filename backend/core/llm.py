@@ -1,8 +1,13 @@
 # backend/core/llm.py
 
+import asyncio
 import os
+import threading
+from typing import AsyncIterator, List, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from core.llm_cache import LLM_CACHE_TTL, get_llm_cache, response_key
 
 # Load biến môi trường từ file .env (ở gốc project)
 load_dotenv()
@@ -12,17 +17,189 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("❌ OPENAI_API_KEY chưa được thiết lập trong file .env")
 
-# Khởi tạo OpenAI client
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Khởi tạo OpenAI client (sync cho agent, async cho endpoint streaming)
 client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# Token đã dùng theo agent: {agent: {calls, cached, prompt_tokens, completion_tokens}}
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def _record_usage(agent: str, usage=None, cached: bool = False):
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    with _usage_lock:
+        stats = _usage.setdefault(agent, {
+            "calls": 0,
+            "cached": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0
+        })
+        stats["calls"] += 1
+        stats["cached"] += int(cached)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+
+    if not cached:
+        print(f"📊 LLM [{agent}] prompt={prompt_tokens} completion={completion_tokens} token")
 
 
-def chat_with_ai(prompt: str) -> str:
+# =====================
+# LLM GATEWAY (MỌI AGENT GỌI QUA ĐÂY)
+# =====================
+def chat_completion(
+    messages: List[dict],
+    model: str = DEFAULT_MODEL,
+    temperature: Optional[float] = None,
+    cache: bool = False,
+    ttl: float = LLM_CACHE_TTL,
+    agent: str = "default",
+    **params
+) -> str:
+    """
+    Gọi chat completion, trả về nội dung text
+    cache=True → cùng model + temperature + messages trả lời lại từ SQLite (core.llm_cache)
+    Chỉ nên bật cho lời gọi mà kết quả chỉ phụ thuộc input (tóm tắt, trích chủ đề, ...)
+    agent: nhãn để thống kê token prompt / completion theo agent (/stats → llm.usage)
+    """
+    key = None
+    if cache:
+        key = response_key(model, temperature, messages, **params)
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            _record_usage(agent, cached=True)
+            return cached
+
+    if temperature is not None:
+        params["temperature"] = temperature
+
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
+        model=model,
+        messages=messages,
+        **params
+    )
+    content = response.choices[0].message.content or ""
+    _record_usage(agent, response.usage)
+
+    if key and content.strip():
+        get_llm_cache().set(key, model, content, ttl=ttl)
+    return content
+
+
+async def achat_completion(
+    messages: List[dict],
+    model: str = DEFAULT_MODEL,
+    temperature: Optional[float] = None,
+    cache: bool = False,
+    ttl: float = LLM_CACHE_TTL,
+    agent: str = "default",
+    **params
+) -> str:
+    """
+    Bản async của chat_completion (AsyncOpenAI) cho request path của API
+    Chờ OpenAI không giữ thread nào → 1 worker giữ được hàng trăm request đang chờ
+    """
+    key = None
+    if cache:
+        key = response_key(model, temperature, messages, **params)
+        cached = await asyncio.to_thread(get_llm_cache().get, key)
+        if cached is not None:
+            _record_usage(agent, cached=True)
+            return cached
+
+    if temperature is not None:
+        params["temperature"] = temperature
+
+    response = await async_client.chat.completions.create(
+        model=model,
+        messages=messages,
+        **params
+    )
+    content = response.choices[0].message.content or ""
+    _record_usage(agent, response.usage)
+
+    if key and content.strip():
+        await asyncio.to_thread(get_llm_cache().set, key, model, content, ttl)
+    return content
+
+
+async def stream_chat_completion(
+    messages: List[dict],
+    model: str = DEFAULT_MODEL,
+    temperature: Optional[float] = None,
+    cache: bool = False,
+    ttl: float = LLM_CACHE_TTL,
+    agent: str = "default",
+    **params
+) -> AsyncIterator[str]:
+    """
+    Như chat_completion nhưng yield từng đoạn text ngay khi model sinh ra
+    Dừng vòng lặp (client ngắt kết nối) → đóng stream → huỷ request phía OpenAI
+    cache=True: trúng cache → yield 1 lần cả câu trả lời; chỉ lưu khi stream chạy hết
+    và model dừng tự nhiên (bị cắt vì max_tokens / bị ngắt giữa chừng → không lưu)
+    """
+    key = None
+    if cache:
+        key = response_key(model, temperature, messages, **params)
+        cached = await asyncio.to_thread(get_llm_cache().get, key)
+        if cached is not None:
+            _record_usage(agent, cached=True)
+            yield cached
+            return
+
+    if temperature is not None:
+        params["temperature"] = temperature
+
+    stream = await async_client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        # chunk cuối (choices rỗng) mang usage của cả request
+        stream_options={"include_usage": True},
+        **params
+    )
+
+    parts = []
+    usage = None
+    finish_reason = None
+    try:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    finally:
+        await stream.close()
+        _record_usage(agent, usage)
+
+    # tới đây = stream đã chạy hết (consumer dừng sớm → GeneratorExit, không tới dòng này)
+    content = "".join(parts)
+    if key and content.strip() and finish_reason not in (None, "length"):
+        await asyncio.to_thread(get_llm_cache().set, key, model, content, ttl)
+
+
+def get_llm_stats() -> dict:
+    with _usage_lock:
+        usage = {agent: dict(stats) for agent, stats in _usage.items()}
+    return {"cache": get_llm_cache().stats(), "usage": usage}
+
+
+async def chat_with_ai(prompt: str) -> str:
+    content = await achat_completion(
         messages=[
             {"role": "system", "content": "Bạn là trợ lý học tập thông minh."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.3
+        temperature=0.3,
+        agent="chat"
     )
-    return response.choices[0].message.content.strip()
+    return content.strip()
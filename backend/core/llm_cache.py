@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+# =====================
+# CONFIG
+# =====================
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.db")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+EVICT_EVERY = 50       # kiểm tra kích thước sau mỗi N lần ghi
+
+
+def response_key(model: str, temperature: Optional[float], messages: List[dict], **params) -> str:
+    """
+    sha256(model + temperature + messages + tham số khác như response_format)
+    """
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages, **params},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache câu trả lời LLM trên SQLite (dùng chung mọi agent, giữ qua restart)
+    - Hết hạn theo TTL (có thể khác nhau từng lần gọi)
+    - Giới hạn số bản ghi: vượt LLM_CACHE_MAX_ENTRIES → xoá bản ít dùng gần đây nhất
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            content TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses(last_used)"
+        )
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT content FROM llm_responses WHERE key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+        conn.close()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row else None
+
+    def set(self, key: str, model: str, content: str, ttl: float = LLM_CACHE_TTL):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, model, content, expires_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, model, content, now + ttl, now)
+        )
+        conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 0
+        if evict:
+            self._evict(conn, now)
+        conn.close()
+
+    def _evict(self, conn, now: float):
+        cur = conn.cursor()
+        cur.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,))
+        removed = cur.rowcount
+
+        count = cur.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        if count > self.max_entries:
+            cur.execute("""
+            DELETE FROM llm_responses WHERE key IN (
+                SELECT key FROM llm_responses ORDER BY last_used LIMIT ?
+            )
+            """, (count - self.max_entries,))
+            removed += cur.rowcount
+
+        conn.commit()
+        with self._lock:
+            self.evictions += removed
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        size = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        conn.close()
+
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+import tiktoken
+
+from core.cache import LRUCache
+
+# =====================
+# CONFIG
+# =====================
+# gpt-4o / gpt-4o-mini dùng o200k_base
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+TOKEN_CACHE_SIZE = 50000
+
+# Token thêm cho mỗi message (role, phân cách) theo cách OpenAI tính
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_failed = False
+_lock = threading.Lock()
+
+# Số token theo hash của text → mỗi chunk chỉ encode 1 lần / process
+_counts = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+
+
+def _get_encoding():
+    """
+    Encoding tải 1 lần / process
+    Không tải được (máy không có mạng, chưa có TIKTOKEN_CACHE_DIR) → ước lượng theo ký tự
+    """
+    global _encoding, _encoding_failed
+
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+
+    with _lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                _encoding_failed = True
+                print(f"⚠️ Không tải được tiktoken {TOKEN_ENCODING} → ước lượng token theo ký tự:", e)
+        return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    # ~3 ký tự / token với tiếng Việt
+    return len(text) // 3 + 1
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(f"{TOKEN_ENCODING}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def count_tokens(text: str, key: Optional[str] = None) -> int:
+    if not text:
+        return 0
+
+    key = key or text_key(text)
+    tokens = _counts.get(key)
+    if tokens is not None:
+        return tokens
+
+    encoding = _get_encoding()
+    tokens = len(encoding.encode(text)) if encoding else estimate_tokens(text)
+    _counts.set(key, tokens)
+    return tokens
+
+
+def remember_tokens(key: str, tokens: int):
+    """
+    Nạp số token đã tính sẵn (lưu cùng chunk lúc index) vào cache RAM
+    """
+    _counts.set(key, tokens)
+
+
+def count_message_tokens(messages) -> int:
+    return sum(
+        count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS
+        for m in messages
+    ) + 2
+
+
+def context_budget(total_tokens: int, prompt_tokens: int, output_tokens: int) -> int:
+    """
+    Token còn lại cho ngữ cảnh = ngân sách cả request − phần prompt cố định − output dự kiến
+    """
+    return max(0, total_tokens - prompt_tokens - output_tokens)
@@ -1,10 +1,116 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
 
 DB_NAME = "data/database.db"
 os.makedirs("data", exist_ok=True)
 
-def get_connection():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+# =====================
+# CONFIG
+# =====================
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))          # connection giữ lại để dùng lại
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))  # page cache / connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+_wal_lock = threading.Lock()
+_wal_ready = False
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Connection mới + PRAGMA:
+    - WAL: đọc không chặn ghi, ghi không chặn đọc (hết "database is locked" khi vừa đọc vừa ghi)
+    - synchronous=NORMAL: an toàn với WAL, fsync ít hơn nhiều so với FULL
+    - busy_timeout: 2 lệnh ghi đồng thời → chờ thay vì lỗi ngay
+    """
+    global _wal_ready
+
+    conn = sqlite3.connect(
+        DB_NAME,
+        check_same_thread=False,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000
+    )
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+
+    # journal_mode lưu trong file DB → chỉ cần đặt 1 lần / process
+    if not _wal_ready:
+        with _wal_lock:
+            if not _wal_ready:
+                conn.execute("PRAGMA journal_mode = WAL")
+                _wal_ready = True
+
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     conn.execute("PRAGMA foreign_keys = ON")
     return conn
+
+
+# =====================
+# POOL
+# =====================
+def _acquire() -> sqlite3.Connection:
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        # pool rỗng → mở thêm (không chặn), trả lại thừa thì đóng
+        return _connect()
+
+
+def _release(conn: sqlite3.Connection):
+    try:
+        # transaction bị bỏ dở không được theo connection sang người mượn sau
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+    except sqlite3.Error:
+        conn.close()
+
+
+@contextmanager
+def connection():
+    """
+    Mượn 1 connection cho các lệnh đọc (hoặc tự commit) → trả lại pool khi ra khỏi with
+    """
+    conn = _acquire()
+    try:
+        yield conn
+    finally:
+        _release(conn)
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """
+    1 transaction: commit khi khối with chạy xong, rollback khi có exception
+    immediate=True → BEGIN IMMEDIATE: giữ khoá ghi ngay từ đầu cho đọc-rồi-ghi
+    (2 request đồng thời không cùng đọc 1 trạng thái cũ)
+    """
+    conn = _acquire()
+    try:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _release(conn)
+
+
+def close_db():
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
@@ -1,86 +1,334 @@
-from datetime import datetime
-from database.db import get_connection
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from database.db import connection, transaction
+from database.ingest_job import JOB_QUEUED, JOB_RUNNING
 
 
 # =========================
-# TẠO BẢNG DOCUMENT
+# TRẠNG THÁI INDEX
 # =========================
-def create_document_table():
-    conn = get_connection()
-    cur = conn.cursor()
+INDEX_PENDING = "pending"
+INDEX_INDEXING = "indexing"
+INDEX_READY = "ready"
+INDEX_FAILED = "failed"
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        filename TEXT NOT NULL,
-        filepath TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    """)
 
-    conn.commit()
-    conn.close()
+# =========================
+# LƯU DOCUMENT
+# =========================
+def save_document(user_id, filename, filepath, index_status=INDEX_PENDING):
+    with transaction() as conn:
+        cur = conn.execute("""
+        INSERT INTO documents (user_id, filename, filepath, created_at, created_ts, index_status)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            user_id,
+            filename,
+            filepath,
+            datetime.now().strftime("%Y-%m-%d %H:%M"),
+            int(time.time()),
+            index_status
+        ))
+        return cur.lastrowid
 
 
 # =========================
-# LƯU DOCUMENT
+# LƯU DOCUMENT THEO NỘI DUNG (DEDUP)
 # =========================
-def save_document(user_id, filename, filepath):
-    conn = get_connection()
-    cur = conn.cursor()
+def save_document_dedup(user_id, filename, filepath, content_hash):
+    """
+    Nếu đã có file trùng sha256 (và index chưa lỗi)
+    → document mới dùng lại file + chunk của document gốc (source_id), ref_count + 1
+    Ngược lại document mới trở thành nguồn index
+
+    Trả về (document_id, source_id, index_status, is_new_source)
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    now_ts = int(time.time())
+
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+        SELECT source_id, filepath, index_status
+        FROM document_blobs
+        WHERE content_hash = ?
+        """, (content_hash,))
+        blob = cur.fetchone()
+
+        if blob and blob[2] != INDEX_FAILED:
+            source_id, blob_path, status = blob
+
+            cur.execute("""
+            INSERT INTO documents (
+                user_id, filename, filepath, created_at, created_ts,
+                index_status, content_hash, source_id
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, filename, blob_path, now, now_ts, status, content_hash, source_id))
+            doc_id = cur.lastrowid
+
+            cur.execute("""
+            UPDATE document_blobs
+            SET ref_count = ref_count + 1
+            WHERE content_hash = ?
+            """, (content_hash,))
+
+            return doc_id, source_id, status, False
+
+        cur.execute("""
+        INSERT INTO documents (
+            user_id, filename, filepath, created_at, created_ts, index_status, content_hash
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, filename, filepath, now, now_ts, INDEX_PENDING, content_hash))
+        doc_id = cur.lastrowid
+
+        cur.execute("UPDATE documents SET source_id = ? WHERE id = ?", (doc_id, doc_id))
 
-    cur.execute("""
-    INSERT INTO documents (user_id, filename, filepath, created_at)
-    VALUES (?, ?, ?, ?)
-    """, (
-        user_id,
-        filename,
-        filepath,
-        datetime.now().strftime("%Y-%m-%d %H:%M")
-    ))
+        if blob:
+            # Lần index trước lỗi → document mới index lại
+            cur.execute("""
+            UPDATE document_blobs
+            SET source_id = ?, filepath = ?, index_status = ?, ref_count = ref_count + 1
+            WHERE content_hash = ?
+            """, (doc_id, filepath, INDEX_PENDING, content_hash))
+        else:
+            cur.execute("""
+            INSERT INTO document_blobs (
+                content_hash, filepath, source_id, ref_count, index_status, created_at
+            )
+            VALUES (?, ?, ?, 1, ?, ?)
+            """, (content_hash, filepath, doc_id, INDEX_PENDING, now))
 
-    doc_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return doc_id
+        return doc_id, doc_id, INDEX_PENDING, True
 
 
 # =========================
 # LẤY DOCUMENT THEO USER
 # =========================
 def get_documents_by_user(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    with connection() as conn:
+        return conn.execute("""
+        SELECT id, filename, created_at, index_status
+        FROM documents
+        WHERE user_id = ?
+        ORDER BY created_ts DESC, id DESC
+        """, (user_id,)).fetchall()
 
-    cur.execute("""
-    SELECT id, filename, created_at
-    FROM documents
-    WHERE user_id = ?
-    ORDER BY created_at DESC
-    """, (user_id,))
 
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+# =========================
+# TRẠNG THÁI INDEX CỦA DOCUMENT
+# =========================
+def get_document_status(doc_id):
+    with connection() as conn:
+        row = conn.execute("""
+        SELECT index_status
+        FROM documents
+        WHERE id = ?
+        """, (doc_id,)).fetchone()
+
+    return row[0] if row else None
+
+
+def set_document_status(doc_id, status):
+    """
+    Cập nhật trạng thái cho document nguồn + mọi document dùng chung index
+    """
+    with transaction() as conn:
+        conn.execute("""
+        UPDATE documents
+        SET index_status = ?
+        WHERE id = ? OR source_id = ?
+        """, (status, doc_id, doc_id))
+
+        conn.execute("""
+        UPDATE document_blobs
+        SET index_status = ?
+        WHERE source_id = ?
+        """, (status, doc_id))
+
+
+# =========================
+# DOCUMENT → NGUỒN INDEX (CHUNK TRONG VECTOR DB)
+# =========================
+def get_index_source(doc_id):
+    """
+    Chunk trong vector DB được gắn document_id của document nguồn
+    Document upload trùng file dùng lại chunk của nguồn
+    """
+    with connection() as conn:
+        row = conn.execute("""
+        SELECT COALESCE(source_id, id)
+        FROM documents
+        WHERE id = ?
+        """, (doc_id,)).fetchone()
+
+    return row[0] if row else doc_id
 
 
 # =========================
 # XOÁ DOCUMENT (FIX BUG 2 CLICK)
 # =========================
 def delete_document(doc_id, user_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    """
+    Xoá row documents (+ flashcard / quiz của nó) + giảm ref_count của file dùng chung
+
+    Trả về None nếu không xoá được, ngược lại dict:
+    - released: True khi không còn document nào dùng file / chunk này
+    - source_id, filepath: để dọn vector + file khi released
+    """
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+        SELECT content_hash, filepath
+        FROM documents
+        WHERE id = ? AND user_id = ?
+        """, (doc_id, user_id))
+        row = cur.fetchone()
+
+        if row is None:
+            return None
+
+        # Flashcard set (+ thẻ) / quiz của document xoá theo ON DELETE CASCADE
+        cur.execute("""
+        DELETE FROM documents
+        WHERE id = ? AND user_id = ?
+        """, (doc_id, user_id))
+
+        result = {"released": False, "source_id": None, "filepath": None}
+        content_hash, filepath = row
+
+        if not content_hash:
+            # Document cũ (trước khi có dedup) → chunk + file chỉ của riêng nó
+            result = {"released": True, "source_id": doc_id, "filepath": filepath}
+
+        else:
+            cur.execute("""
+            UPDATE document_blobs
+            SET ref_count = ref_count - 1
+            WHERE content_hash = ?
+            """, (content_hash,))
+
+            cur.execute("""
+            SELECT source_id, filepath, ref_count
+            FROM document_blobs
+            WHERE content_hash = ?
+            """, (content_hash,))
+            blob = cur.fetchone()
+
+            if blob and blob[2] <= 0:
+                cur.execute(
+                    "DELETE FROM document_blobs WHERE content_hash = ?",
+                    (content_hash,)
+                )
+                result = {"released": True, "source_id": blob[0], "filepath": blob[1]}
+
+    return result
+
+
+# =========================
+# DÙNG CHO COMPACTION
+# =========================
+def get_live_sources():
+    """
+    Tập document_id đang được tham chiếu bởi chunk trong vector DB
+    """
+    with connection() as conn:
+        rows = conn.execute("SELECT DISTINCT COALESCE(source_id, id) FROM documents").fetchall()
+    return {r[0] for r in rows}
+
+
+def confirm_orphan_sources(source_ids, grace_seconds=0):
+    """
+    Kiểm tra lại ngay trước khi compaction xoá: giữ lại source_id vẫn mồ côi
+    Bỏ qua nguồn đã có document / blob tham chiếu (tạo sau lúc chụp live_sources),
+    đang có job index queued / running, hoặc job vừa cập nhật trong grace_seconds
+    """
+    source_ids = list(dict.fromkeys(s for s in source_ids if s is not None))
+    if not source_ids:
+        return set()
+
+    cutoff = (datetime.now() - timedelta(seconds=grace_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+    busy = set()
+
+    with connection() as conn:
+        for i in range(0, len(source_ids), 500):
+            batch = source_ids[i:i + 500]
+            marks = ", ".join("?" * len(batch))
+            rows = conn.execute(f"""
+            SELECT COALESCE(source_id, id) FROM documents
+            WHERE id IN ({marks}) OR source_id IN ({marks})
+            UNION
+            SELECT source_id FROM document_blobs WHERE source_id IN ({marks})
+            UNION
+            SELECT document_id FROM ingest_jobs
+            WHERE document_id IN ({marks})
+              AND (status IN (?, ?) OR updated_at >= ?)
+            """, (*batch, *batch, *batch, *batch, JOB_QUEUED, JOB_RUNNING, cutoff)).fetchall()
+            busy.update(r[0] for r in rows)
+
+    return set(source_ids) - busy
+
+
+def get_referenced_files():
+    with connection() as conn:
+        rows = conn.execute("""
+        SELECT filepath FROM documents
+        UNION
+        SELECT filepath FROM document_blobs
+        """).fetchall()
+    return {r[0] for r in rows}
+
+
+def delete_file_if_unreferenced(filepath) -> bool:
+    """
+    Xoá file PDF nếu không còn document / blob nào trỏ tới
+    Kiểm tra + xoá trong cùng 1 transaction ghi → upload lại đúng nội dung đó
+    (cùng {sha256}.pdf) không bị reaper xoá mất file
+    """
+    with transaction(immediate=True) as conn:
+        referenced = conn.execute("""
+        SELECT 1 FROM documents WHERE filepath = ?
+        UNION ALL
+        SELECT 1 FROM document_blobs WHERE filepath = ?
+        LIMIT 1
+        """, (filepath, filepath)).fetchone()
+
+        if referenced:
+            return False
+
+        Path(filepath).unlink(missing_ok=True)
+        return True
+
+
+def get_live_document_for_source(source_id):
+    """
+    1 document còn tồn tại dùng index của source_id → (document_id, index_status) hoặc None
+    (document nguồn có thể đã bị xoá trong khi bản upload trùng vẫn còn)
+    """
+    with connection() as conn:
+        return conn.execute("""
+        SELECT id, index_status
+        FROM documents
+        WHERE source_id = ? OR (id = ? AND source_id IS NULL)
+        ORDER BY id
+        LIMIT 1
+        """, (source_id, source_id)).fetchone()
 
-    cur.execute("""
-    DELETE FROM documents
-    WHERE id = ? AND user_id = ?
-    """, (doc_id, user_id))
 
-    conn.commit()
+def get_document_owner(doc_id):
+    with connection() as conn:
+        row = conn.execute("SELECT user_id FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    return row[0] if row else None
 
-    deleted = cur.rowcount  # ✅ SỐ ROW ĐÃ XOÁ
-    conn.close()
 
-    return deleted > 0
+def is_document_owner(doc_id, user_id):
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM documents WHERE id = ? AND user_id = ?",
+            (doc_id, user_id)
+        ).fetchone()
+    return row is not None
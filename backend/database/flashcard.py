@@ -1,45 +1,52 @@
-import sqlite3
+import time
 from datetime import datetime
-from database.db import get_connection
+from itertools import islice
+from database.db import connection, transaction
+
+# Ghi / đọc thẻ theo lô → deck hàng nghìn thẻ không phải giữ hết trong RAM
+CARD_BATCH_SIZE = 500
 
 
 # =========================
-# CREATE TABLES
+# SAVE FLASHCARD SET
 # =========================
-def create_flashcard_tables():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS flashcard_sets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        document_id INTEGER NOT NULL,
-        title TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        FOREIGN KEY (user_id) REFERENCES users(id),
-        FOREIGN KEY (document_id) REFERENCES documents(id)
-    )
-    """)
-
+def _insert_set(cursor, user_id, document_id, title) -> int:
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS flashcards (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        set_id INTEGER NOT NULL,
-        question TEXT NOT NULL,
-        answer TEXT NOT NULL,
-        FOREIGN KEY (set_id) REFERENCES flashcard_sets(id)
-            ON DELETE CASCADE
+    INSERT INTO flashcard_sets (
+        user_id,
+        document_id,
+        title,
+        created_at,
+        created_ts
     )
-    """)
+    VALUES (?, ?, ?, ?, ?)
+    """, (
+        user_id,
+        document_id,
+        title,
+        datetime.now().strftime("%Y-%m-%d %H:%M"),
+        int(time.time())
+    ))
+    return cursor.lastrowid
+
+
+def _insert_cards(cursor, set_id, cards) -> int:
+    """
+    executemany theo lô CARD_BATCH_SIZE thẻ, trả về số thẻ đã ghi
+    """
+    cards = iter(cards)
+    total = 0
+
+    while batch := list(islice(cards, CARD_BATCH_SIZE)):
+        cursor.executemany("""
+        INSERT INTO flashcards (set_id, question, answer)
+        VALUES (?, ?, ?)
+        """, [(set_id, card["question"], card["answer"]) for card in batch])
+        total += len(batch)
+
+    return total
 
-    conn.commit()
-    conn.close()
 
-
-# =========================
-# SAVE FLASHCARD SET
-# =========================
 def save_flashcard_set(
     user_id: int,
     document_id: int,
@@ -47,65 +54,59 @@ def save_flashcard_set(
     cards: list
 ) -> int | None:
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("""
-        INSERT INTO flashcard_sets (
-            user_id,
-            document_id,
-            title,
-            created_at
-        )
-        VALUES (?, ?, ?, ?)
-        """, (
-            user_id,
-            document_id,
-            title,
-            datetime.now().strftime("%Y-%m-%d %H:%M")
-        ))
-
-        set_id = cursor.lastrowid
-
-        for card in cards:
-            cursor.execute("""
-            INSERT INTO flashcards (set_id, question, answer)
-            VALUES (?, ?, ?)
-            """, (
-                set_id,
-                card["question"],
-                card["answer"]
-            ))
-
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.cursor()
+            set_id = _insert_set(cursor, user_id, document_id, title)
+            _insert_cards(cursor, set_id, cards)
+
         return set_id
 
     except Exception as e:
-        conn.rollback()
         print("❌ DB ERROR save_flashcard_set:", e)
         return None
 
-    finally:
-        conn.close()
+
+# =========================
+# IMPORT DECK LỚN (1 TRANSACTION)
+# =========================
+def import_flashcard_set(
+    user_id: int,
+    document_id: int,
+    title: str,
+    cards,
+    max_cards: int
+) -> tuple[int, int]:
+    """
+    cards: iterable thẻ (đọc dần từ file) → ghi theo lô trong cùng 1 transaction
+    Quá max_cards / không có thẻ nào → ValueError, không ghi gì
+    Trả về (set_id, total_cards)
+    """
+    with transaction() as conn:
+        cursor = conn.cursor()
+        set_id = _insert_set(cursor, user_id, document_id, title)
+
+        # đọc thừa 1 thẻ để biết deck có vượt giới hạn không
+        total = _insert_cards(cursor, set_id, islice(cards, max_cards + 1))
+        if total > max_cards:
+            raise ValueError(f"❌ Deck vượt quá {max_cards} thẻ")
+        if total == 0:
+            raise ValueError("❌ Không có thẻ hợp lệ (cần question + answer)")
+
+    return set_id, total
 
 
 # =========================
 # LIST FLASHCARD SETS (THEO DOCUMENT)
 # =========================
 def get_all_flashcard_sets(user_id: int, document_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    SELECT id, title, created_at
-    FROM flashcard_sets
-    WHERE user_id = ? AND document_id = ?
-    ORDER BY created_at DESC
-    """, (user_id, document_id))
-
-    rows = cursor.fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("""
+        SELECT id, title, created_at
+        FROM flashcard_sets
+        WHERE user_id = ? AND document_id = ?
+        ORDER BY created_ts DESC, id DESC
+        """, (user_id, document_id)).fetchall()
 
     return [
         {
@@ -121,18 +122,14 @@ def get_all_flashcard_sets(user_id: int, document_id: int):
 # GET FLASHCARD SET DETAIL
 # =========================
 def get_flashcard_set_by_id(set_id: int, user_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    SELECT fc.question, fc.answer
-    FROM flashcards fc
-    JOIN flashcard_sets fs ON fc.set_id = fs.id
-    WHERE fs.id = ? AND fs.user_id = ?
-    """, (set_id, user_id))
-
-    rows = cursor.fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("""
+        SELECT fc.question, fc.answer
+        FROM flashcards fc
+        JOIN flashcard_sets fs ON fc.set_id = fs.id
+        WHERE fs.id = ? AND fs.user_id = ?
+        ORDER BY fc.id
+        """, (set_id, user_id)).fetchall()
 
     return [
         {
@@ -143,17 +140,63 @@ def get_flashcard_set_by_id(set_id: int, user_id: int):
     ]
 
 
+# =========================
+# EXPORT MỌI BỘ THẺ CỦA 1 DOCUMENT (THEO LÔ)
+# =========================
+def iter_flashcard_export(user_id: int, document_id: int, batch_size: int = CARD_BATCH_SIZE):
+    """
+    Yield từng lô (set_id, set_title, created_at, question, answer), bộ cũ trước
+    Mỗi bộ phân trang theo id thẻ (idx_flashcards_set), mượn connection theo từng lô
+    → không giữ connection / cả deck trong RAM khi client đọc chậm
+    """
+    with connection() as conn:
+        sets = conn.execute("""
+        SELECT id, title, created_at
+        FROM flashcard_sets
+        WHERE user_id = ? AND document_id = ?
+        ORDER BY created_ts, id
+        """, (user_id, document_id)).fetchall()
+
+    for set_id, title, created_at in sets:
+        last_id = 0
+
+        while True:
+            with connection() as conn:
+                rows = conn.execute("""
+                SELECT id, question, answer
+                FROM flashcards
+                WHERE set_id = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+                """, (set_id, last_id, batch_size)).fetchall()
+
+            if not rows:
+                break
+
+            last_id = rows[-1][0]
+            yield [(set_id, title, created_at, question, answer) for _, question, answer in rows]
+
+
 # =========================
 # DELETE FLASHCARD SET
 # =========================
 def delete_flashcard_set(set_id: int, user_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        conn.execute("""
+        DELETE FROM flashcard_sets
+        WHERE id = ? AND user_id = ?
+        """, (set_id, user_id))
 
-    cursor.execute("""
-    DELETE FROM flashcard_sets
-    WHERE id = ? AND user_id = ?
-    """, (set_id, user_id))
 
-    conn.commit()
-    conn.close()
+# =========================
+# XOÁ FLASHCARD MỒ CÔI (COMPACTION)
+# =========================
+def delete_orphan_flashcard_sets() -> int:
+    """
+    Xoá flashcard set có document_id không còn trong bảng documents
+    """
+    with transaction() as conn:
+        return conn.execute("""
+        DELETE FROM flashcard_sets
+        WHERE document_id NOT IN (SELECT id FROM documents)
+        """).rowcount
@@ -0,0 +1,107 @@
+from datetime import datetime
+from database.db import connection, transaction
+
+
+# =========================
+# TRẠNG THÁI JOB
+# =========================
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# =========================
+# TẠO JOB MỚI
+# =========================
+def create_ingest_job(job_id, document_id, filepath):
+    now = _now()
+    with transaction() as conn:
+        conn.execute("""
+        INSERT INTO ingest_jobs (
+            id, document_id, filepath, status, stage, progress, created_at, updated_at
+        )
+        VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+        """, (job_id, document_id, filepath, JOB_QUEUED, JOB_QUEUED, now, now))
+
+
+# =========================
+# CẬP NHẬT TIẾN ĐỘ
+# =========================
+def update_ingest_job(job_id, **fields):
+    """
+    Cập nhật các cột status / stage / progress / total_chunks / error
+    """
+    allowed = {"status", "stage", "progress", "total_chunks", "error"}
+    fields = {k: v for k, v in fields.items() if k in allowed}
+    if not fields:
+        return
+
+    fields["updated_at"] = _now()
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE ingest_jobs SET {assignments} WHERE id = ?",
+            (*fields.values(), job_id)
+        )
+
+
+# =========================
+# LẤY JOB
+# =========================
+def get_ingest_job(job_id):
+    with connection() as conn:
+        row = conn.execute("""
+        SELECT id, document_id, status, stage, progress, total_chunks, error,
+               created_at, updated_at
+        FROM ingest_jobs
+        WHERE id = ?
+        """, (job_id,)).fetchone()
+
+    if row is None:
+        return None
+
+    return {
+        "job_id": row[0],
+        "document_id": row[1],
+        "status": row[2],
+        "stage": row[3],
+        "progress": row[4],
+        "total_chunks": row[5],
+        "error": row[6],
+        "created_at": row[7],
+        "updated_at": row[8]
+    }
+
+
+# =========================
+# JOB CHƯA XONG (KHÔI PHỤC SAU KHI RESTART)
+# =========================
+def get_unfinished_ingest_jobs():
+    with connection() as conn:
+        return conn.execute("""
+        SELECT id, document_id, filepath
+        FROM ingest_jobs
+        WHERE status IN (?, ?)
+        ORDER BY created_at
+        """, (JOB_QUEUED, JOB_RUNNING)).fetchall()
+
+
+# =========================
+# JOB MỚI NHẤT CỦA DOCUMENT
+# =========================
+def get_latest_ingest_job_id(document_id):
+    with connection() as conn:
+        row = conn.execute("""
+        SELECT id
+        FROM ingest_jobs
+        WHERE document_id = ?
+        ORDER BY created_at DESC
+        LIMIT 1
+        """, (document_id,)).fetchone()
+    return row[0] if row else None
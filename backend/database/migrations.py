@@ -0,0 +1,345 @@
+from database.db import connection
+
+# =========================
+# MIGRATION THEO PHIÊN BẢN (PRAGMA user_version)
+# =========================
+# Mỗi migration chạy đúng 1 lần / DB, trong 1 transaction riêng:
+# lỗi → rollback, DB giữ nguyên phiên bản cũ, lần khởi động sau chạy lại
+# Thêm thay đổi schema = thêm 1 hàm @migration(N + 1, ...), KHÔNG sửa migration cũ
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+# created_at "YYYY-MM-DD HH:MM" (giờ máy chủ) → epoch giây
+_EPOCH_FROM_TEXT = "COALESCE(CAST(strftime('%s', created_at, 'utc') AS INTEGER), 0)"
+
+
+# =========================
+# 1. SCHEMA GỐC (TRƯỚC KHI CÓ MIGRATION)
+# =========================
+@migration(1, "baseline schema")
+def _baseline(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        index_status TEXT NOT NULL DEFAULT 'pending',
+        content_hash TEXT,
+        source_id INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+
+    # DB rất cũ chưa có cột mới → document cũ coi như đã index xong
+    columns = [r[1] for r in cur.execute("PRAGMA table_info(documents)")]
+    if "index_status" not in columns:
+        cur.execute(
+            "ALTER TABLE documents ADD COLUMN index_status TEXT NOT NULL DEFAULT 'ready'"
+        )
+    if "content_hash" not in columns:
+        cur.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+    if "source_id" not in columns:
+        cur.execute("ALTER TABLE documents ADD COLUMN source_id INTEGER")
+
+    # 1 file PDF (theo sha256) ↔ 1 bản index dùng chung, đếm số document tham chiếu
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS document_blobs (
+        content_hash TEXT PRIMARY KEY,
+        filepath TEXT NOT NULL,
+        source_id INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        index_status TEXT NOT NULL DEFAULT 'pending',
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS quiz_templates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        document_id INTEGER,
+        title TEXT NOT NULL,
+        questions_json TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (document_id) REFERENCES documents(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS flashcard_sets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        document_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (document_id) REFERENCES documents(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS flashcards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        set_id INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        FOREIGN KEY (set_id) REFERENCES flashcard_sets(id)
+            ON DELETE CASCADE
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        id TEXT PRIMARY KEY,
+        document_id INTEGER NOT NULL,
+        filepath TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        progress REAL NOT NULL DEFAULT 0,
+        total_chunks INTEGER,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (document_id) REFERENCES documents(id)
+            ON DELETE CASCADE
+    )
+    """)
+
+    # Định tuyến: nguồn index → collection Chroma
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS vector_partitions (
+        source_id INTEGER PRIMARY KEY,
+        collection TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+        text,
+        folded,
+        source_id UNINDEXED,
+        page_no UNINDEXED,
+        tokenize = "unicode61 remove_diacritics 2"
+    )
+    """)
+
+    # Cùng nội dung nhưng theo chunk (đơn vị của vector search) → dùng cho hybrid retrieval
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5(
+        text,
+        folded,
+        source_id UNINDEXED,
+        chunk_no UNINDEXED,
+        tokenize = "unicode61 remove_diacritics 2"
+    )
+    """)
+
+    # Số token của từng chunk (tính 1 lần lúc index) → ghép ngữ cảnh theo ngân sách token
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chunk_tokens (
+        source_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        PRIMARY KEY (source_id, key)
+    )
+    """)
+
+    # Kho quiz / flashcard sinh sẵn theo nguồn index
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ready_pool (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_ready_pool_source
+    ON ready_pool(source_id, kind, size)
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS quiz_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        topic TEXT,
+        score INTEGER,
+        total INTEGER,
+        created_at TEXT
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS flashcard_progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        question TEXT,
+        known INTEGER
+    )
+    """)
+
+
+# =========================
+# 2. TIMESTAMP SỐ NGUYÊN + ON DELETE CASCADE
+# =========================
+def _rebuild_table(cur, table, create_sql, columns, select_sql):
+    """
+    SQLite không ALTER được khoá ngoại → tạo bảng mới, chép dữ liệu, đổi tên
+    (runner đã tắt foreign_keys nên DROP bảng cũ không kéo theo bảng con)
+    """
+    cur.execute(create_sql.format(table=f"{table}_new"))
+    cur.execute(f"INSERT INTO {table}_new ({columns}) {select_sql}")
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+@migration(2, "integer created_ts + cascade flashcard/quiz with document")
+def _timestamps_and_cascade(cur):
+    # created_at (chuỗi tới phút) giữ nguyên để hiển thị, sắp xếp theo created_ts
+    cur.execute("ALTER TABLE documents ADD COLUMN created_ts INTEGER NOT NULL DEFAULT 0")
+    cur.execute(f"UPDATE documents SET created_ts = {_EPOCH_FROM_TEXT}")
+
+    # Xoá document → flashcard set / quiz của nó xoá theo (trước đây xoá tay trong delete_document)
+    # Bản ghi đã mồ côi (document không còn) bị bỏ khi chép
+    _rebuild_table(cur, "flashcard_sets", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        document_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        created_ts INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+            ON DELETE CASCADE,
+        FOREIGN KEY (document_id) REFERENCES documents(id)
+            ON DELETE CASCADE
+    )
+    """, "id, user_id, document_id, title, created_at, created_ts", f"""
+    SELECT id, user_id, document_id, title, created_at, {_EPOCH_FROM_TEXT}
+    FROM flashcard_sets
+    WHERE document_id IN (SELECT id FROM documents)
+    """)
+
+    cur.execute("DELETE FROM flashcards WHERE set_id NOT IN (SELECT id FROM flashcard_sets)")
+
+    _rebuild_table(cur, "quiz_templates", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        document_id INTEGER,
+        title TEXT NOT NULL,
+        questions_json TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        created_ts INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+            ON DELETE CASCADE,
+        FOREIGN KEY (document_id) REFERENCES documents(id)
+            ON DELETE CASCADE
+    )
+    """, "id, user_id, document_id, title, questions_json, created_at, created_ts", f"""
+    SELECT id, user_id, document_id, title, questions_json, created_at, {_EPOCH_FROM_TEXT}
+    FROM quiz_templates
+    WHERE document_id IS NULL OR document_id IN (SELECT id FROM documents)
+    """)
+
+    for table in ("flashcard_sets", "flashcards", "quiz_templates"):
+        violations = cur.execute(f"PRAGMA foreign_key_check({table})").fetchall()
+        if violations:
+            raise RuntimeError(f"❌ {table}: {len(violations)} dòng vi phạm khoá ngoại")
+
+
+# =========================
+# 3. INDEX CHO CÁC QUERY NÓNG
+# =========================
+@migration(3, "covering indexes for per-user / per-document queries")
+def _indexes(cur):
+    # get_documents_by_user: WHERE user_id ORDER BY created_ts DESC, id DESC → không cần đọc bảng
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_documents_user
+    ON documents(user_id, created_ts, id, filename, created_at, index_status)
+    """)
+    # set_document_status: WHERE id = ? OR source_id = ?
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source_id)")
+
+    # get_all_flashcard_sets / get_all_quizzes: WHERE user_id AND document_id ORDER BY created_ts
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_flashcard_sets_user_document
+    ON flashcard_sets(user_id, document_id, created_ts, id, title, created_at)
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_quiz_templates_user_document
+    ON quiz_templates(user_id, document_id, created_ts, id, title, created_at)
+    """)
+
+    # ON DELETE CASCADE + compaction tìm con theo document_id / set_id
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_flashcard_sets_document ON flashcard_sets(document_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_quiz_templates_document ON quiz_templates(document_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_set ON flashcards(set_id)")
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_document ON ingest_jobs(document_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vector_partitions_collection ON vector_partitions(collection)")
+
+
+# =========================
+# RUNNER
+# =========================
+def get_schema_version():
+    with connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate():
+    """
+    Nâng DB (mới hoặc data/database.db đang có) lên phiên bản mới nhất
+    Trả về phiên bản sau khi chạy
+    """
+    with connection() as conn:
+        # rebuild bảng cần tắt khoá ngoại – PRAGMA này không đổi được trong transaction
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+                # khoá ghi trước khi đọc phiên bản → 2 process khởi động cùng lúc không chạy trùng
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                        conn.rollback()
+                        continue
+
+                    fn(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    conn.commit()
+
+                except Exception:
+                    conn.rollback()
+                    print(f"❌ Migration {version} ({name}) lỗi → rollback")
+                    raise
+
+                print(f"✅ Migration {version}: {name}")
+
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
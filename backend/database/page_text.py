@@ -0,0 +1,259 @@
+import re
+from database.db import connection, transaction
+from database.document import confirm_orphan_sources
+
+# rowid = source_id * PAGE_ROWID_STRIDE + page_no → lọc / xoá theo document bằng khoảng rowid
+PAGE_ROWID_STRIDE = 1_000_000
+
+# unicode61 bỏ dấu thanh nhưng KHÔNG đổi "đ" → "d" (đ là chữ cái riêng)
+# → cột folded lưu bản đã đổi đ/Đ để gõ "duong" vẫn tìm ra "đường"
+_FOLD = str.maketrans({"đ": "d", "Đ": "D"})
+
+
+def fold_text(text: str) -> str:
+    return text.translate(_FOLD)
+
+
+def _rowid_range(source_id):
+    start = source_id * PAGE_ROWID_STRIDE
+    return start, start + PAGE_ROWID_STRIDE - 1
+
+
+# =========================
+# GHI TEXT THEO TRANG
+# =========================
+def save_pages(source_id, pages):
+    """
+    pages: list (page_no, text)
+    """
+    with transaction() as conn:
+        conn.executemany("""
+        INSERT OR REPLACE INTO page_text (rowid, text, folded, source_id, page_no)
+        VALUES (?, ?, ?, ?, ?)
+        """, [
+            (source_id * PAGE_ROWID_STRIDE + page_no, text, fold_text(text), source_id, page_no)
+            for page_no, text in pages
+        ])
+
+
+def delete_pages(source_id):
+    start, end = _rowid_range(source_id)
+
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM page_text WHERE rowid BETWEEN ? AND ?", (start, end)
+        ).rowcount
+
+
+def delete_orphan_pages(live_sources, grace_seconds=0):
+    """
+    Xoá text (trang + chunk) của nguồn index không còn document nào tham chiếu (compaction)
+    Ứng viên được kiểm tra lại với DB trước khi xoá (confirm_orphan_sources)
+    """
+    with connection() as conn:
+        rows = conn.execute("""
+        SELECT source_id FROM page_text
+        UNION
+        SELECT source_id FROM chunk_text
+        """).fetchall()
+    orphans = confirm_orphan_sources(
+        [r[0] for r in rows if r[0] not in live_sources],
+        grace_seconds
+    )
+
+    deleted = 0
+    for source_id in orphans:
+        deleted += delete_pages(source_id)
+        delete_chunks(source_id)
+    return deleted
+
+
+# =========================
+# TEXT THEO CHUNK
+# =========================
+def save_chunks(source_id, chunks):
+    """
+    chunks: list (chunk_no, text)
+    """
+    with transaction() as conn:
+        conn.executemany("""
+        INSERT OR REPLACE INTO chunk_text (rowid, text, folded, source_id, chunk_no)
+        VALUES (?, ?, ?, ?, ?)
+        """, [
+            (source_id * PAGE_ROWID_STRIDE + chunk_no, text, fold_text(text), source_id, chunk_no)
+            for chunk_no, text in chunks
+        ])
+
+
+def delete_chunks(source_id):
+    start, end = _rowid_range(source_id)
+
+    with transaction() as conn:
+        deleted = conn.execute(
+            "DELETE FROM chunk_text WHERE rowid BETWEEN ? AND ?", (start, end)
+        ).rowcount
+        conn.execute("DELETE FROM chunk_tokens WHERE source_id = ?", (source_id,))
+
+    return deleted
+
+
+def save_chunk_tokens(source_id, counts):
+    """
+    counts: list (key, tokens) – key = core.tokens.text_key(chunk)
+    """
+    with transaction() as conn:
+        conn.executemany("""
+        INSERT OR REPLACE INTO chunk_tokens (source_id, key, tokens)
+        VALUES (?, ?, ?)
+        """, [(source_id, key, tokens) for key, tokens in counts])
+
+
+def get_chunk_tokens(source_id, keys):
+    if not keys:
+        return {}
+
+    placeholders = ",".join("?" for _ in keys)
+    with connection() as conn:
+        rows = conn.execute(f"""
+        SELECT key, tokens
+        FROM chunk_tokens
+        WHERE source_id = ? AND key IN ({placeholders})
+        """, (source_id, *keys)).fetchall()
+
+    return dict(rows)
+
+
+# =========================
+# ĐỌC LẠI TEXT (RE-CHUNK / RE-EMBED KHÔNG CẦN PARSE PDF)
+# =========================
+def iter_stored_pages(source_id, batch_size=100):
+    """
+    Text từng trang đã lưu của source_id (theo thứ tự trang) – khác utils.pdf_loader.iter_pages
+    (đọc từ file PDF)
+    """
+    start, end = _rowid_range(source_id)
+    last = start - 1
+
+    while True:
+        # mượn connection theo từng batch → không giữ connection trong lúc caller xử lý
+        with connection() as conn:
+            rows = conn.execute("""
+            SELECT rowid, text
+            FROM page_text
+            WHERE rowid > ? AND rowid <= ?
+            ORDER BY rowid
+            LIMIT ?
+            """, (last, end, batch_size)).fetchall()
+
+        if not rows:
+            return
+
+        for rowid, text in rows:
+            yield text
+        last = rows[-1][0]
+
+
+def count_pages(source_id):
+    start, end = _rowid_range(source_id)
+
+    with connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM page_text WHERE rowid BETWEEN ? AND ?", (start, end)
+        ).fetchone()[0]
+
+
+# =========================
+# TÌM KIẾM BM25
+# =========================
+def build_match_query(query: str, operator: str = "AND") -> str:
+    """
+    Mỗi từ được đặt trong "..." → không dính cú pháp FTS5 (dấu -, :, *, …)
+    """
+    terms = re.findall(r"\w+", query)
+    return f" {operator} ".join(f'"{t}"' for t in terms)
+
+
+def search_pages(source_id, query, limit=10):
+    start, end = _rowid_range(source_id)
+
+    rows = []
+    with connection() as conn:
+        # Ưu tiên trang chứa đủ mọi từ, không có thì nới thành OR
+        for operator in ("AND", "OR"):
+            match = build_match_query(query, operator)
+            if not match:
+                break
+
+            rows = conn.execute("""
+            SELECT page_no,
+                   bm25(page_text),
+                   snippet(page_text, -1, '<b>', '</b>', '…', 16)
+            FROM page_text
+            WHERE page_text MATCH ?
+              AND rowid BETWEEN ? AND ?
+            ORDER BY bm25(page_text)
+            LIMIT ?
+            """, (match, start, end, limit)).fetchall()
+
+            if rows:
+                break
+
+    return [
+        {
+            "page": r[0] + 1,
+            "score": round(-r[1], 4),
+            "snippet": r[2]
+        }
+        for r in rows
+    ]
+
+
+def search_chunks(source_id, query, limit=10):
+    """
+    Chunk xếp hạng BM25 (OR giữa các từ – để RRF quyết định thứ hạng cuối)
+    """
+    match = build_match_query(query, "OR")
+    if not match:
+        return []
+
+    start, end = _rowid_range(source_id)
+
+    with connection() as conn:
+        rows = conn.execute("""
+        SELECT text
+        FROM chunk_text
+        WHERE chunk_text MATCH ?
+          AND rowid BETWEEN ? AND ?
+        ORDER BY bm25(chunk_text)
+        LIMIT ?
+        """, (match, start, end, limit)).fetchall()
+
+    return [r[0] for r in rows]
+
+
+def find_page(source_id, text, words=8):
+    """
+    Trang chứa đoạn mở đầu của text (dùng làm trích dẫn cho chunk), None nếu không thấy
+    Thử cụm từ liên tiếp trước, sau đó AND các từ
+    """
+    terms = re.findall(r"\w+", text)[:words]
+    if not terms:
+        return None
+
+    start, end = _rowid_range(source_id)
+
+    with connection() as conn:
+        for match in ('"' + " ".join(terms) + '"', build_match_query(" ".join(terms), "AND")):
+            row = conn.execute("""
+            SELECT page_no
+            FROM page_text
+            WHERE page_text MATCH ?
+              AND rowid BETWEEN ? AND ?
+            ORDER BY page_no
+            LIMIT 1
+            """, (match, start, end)).fetchone()
+
+            if row:
+                return row[0]
+
+    return None
@@ -1,31 +1,7 @@
 import json
+import time
 from datetime import datetime
-from database.db import get_connection
-
-
-# =========================
-# TẠO BẢNG QUIZ
-# =========================
-def create_quiz_tables():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Bảng quiz gắn với document
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS quiz_templates (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        document_id INTEGER,
-        title TEXT NOT NULL,
-        questions_json TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        FOREIGN KEY (user_id) REFERENCES users(id),
-        FOREIGN KEY (document_id) REFERENCES documents(id)
-    )
-    """)
-
-    conn.commit()
-    conn.close()
+from database.db import connection, transaction
 
 
 # =========================
@@ -33,31 +9,26 @@ def create_quiz_tables():
 # =========================
 def save_quiz(user_id, title, questions, document_id):
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-        INSERT INTO quiz_templates (
-            user_id,
-            document_id,
-            title,
-            questions_json,
-            created_at
-        )
-        VALUES (?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            document_id,
-            title,
-            json.dumps(questions, ensure_ascii=False),
-            datetime.now().strftime("%Y-%m-%d %H:%M")
-        ))
-
-        quiz_id = cur.lastrowid
-        conn.commit()
-        conn.close()
-
-        return quiz_id
+        with transaction() as conn:
+            cur = conn.execute("""
+            INSERT INTO quiz_templates (
+                user_id,
+                document_id,
+                title,
+                questions_json,
+                created_at,
+                created_ts
+            )
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                user_id,
+                document_id,
+                title,
+                json.dumps(questions, ensure_ascii=False),
+                datetime.now().strftime("%Y-%m-%d %H:%M"),
+                int(time.time())
+            ))
+            return cur.lastrowid
 
     except Exception as e:
         print("❌ DB SAVE QUIZ ERROR:", e)
@@ -68,36 +39,25 @@ def save_quiz(user_id, title, questions, document_id):
 # LẤY DANH SÁCH QUIZ (THEO FILE)
 # =========================
 def get_all_quizzes(user_id, document_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-    SELECT id, title, created_at
-    FROM quiz_templates
-    WHERE user_id = ? AND document_id = ?
-    ORDER BY created_at DESC
-    """, (user_id, document_id))
-
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        return conn.execute("""
+        SELECT id, title, created_at
+        FROM quiz_templates
+        WHERE user_id = ? AND document_id = ?
+        ORDER BY created_ts DESC, id DESC
+        """, (user_id, document_id)).fetchall()
 
 
 # =========================
 # LẤY QUIZ THEO ID
 # =========================
 def get_quiz_by_id(quiz_id, user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-    SELECT questions_json
-    FROM quiz_templates
-    WHERE id = ? AND user_id = ?
-    """, (quiz_id, user_id))
-
-    row = cur.fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("""
+        SELECT questions_json
+        FROM quiz_templates
+        WHERE id = ? AND user_id = ?
+        """, (quiz_id, user_id)).fetchone()
 
     if row is None:
         return None
@@ -109,13 +69,23 @@ def get_quiz_by_id(quiz_id, user_id):
 # XOÁ QUIZ
 # =========================
 def delete_quiz(quiz_id, user_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    with transaction() as conn:
+        conn.execute("""
+        DELETE FROM quiz_templates
+        WHERE id = ? AND user_id = ?
+        """, (quiz_id, user_id))
 
-    cur.execute("""
-    DELETE FROM quiz_templates
-    WHERE id = ? AND user_id = ?
-    """, (quiz_id, user_id))
 
-    conn.commit()
-    conn.close()
+# =========================
+# XOÁ QUIZ MỒ CÔI (COMPACTION)
+# =========================
+def delete_orphan_quizzes():
+    """
+    Xoá quiz có document_id không còn trong bảng documents
+    """
+    with transaction() as conn:
+        return conn.execute("""
+        DELETE FROM quiz_templates
+        WHERE document_id IS NOT NULL
+          AND document_id NOT IN (SELECT id FROM documents)
+        """).rowcount
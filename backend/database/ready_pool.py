@@ -0,0 +1,80 @@
+import json
+from datetime import datetime
+from database.db import connection, transaction
+from database.document import confirm_orphan_sources
+
+POOL_QUIZ = "quiz"
+POOL_FLASHCARD = "flashcard"
+
+
+# =========================
+# KHO QUIZ / FLASHCARD SINH SẴN (THEO NGUỒN INDEX)
+# =========================
+def push_ready_item(source_id, kind, items):
+    with transaction() as conn:
+        conn.execute("""
+        INSERT INTO ready_pool (source_id, kind, size, payload, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """, (
+            source_id,
+            kind,
+            len(items),
+            json.dumps(items, ensure_ascii=False),
+            datetime.now().strftime("%Y-%m-%d %H:%M")
+        ))
+
+
+def pop_ready_item(source_id, kind, min_size):
+    """
+    Lấy (và xoá) 1 bộ có ít nhất min_size phần tử, cũ nhất trước
+    Trả về list hoặc None – 2 request đồng thời không nhận trùng 1 bộ
+    """
+    try:
+        with transaction(immediate=True) as conn:
+            row = conn.execute("""
+            SELECT id, payload
+            FROM ready_pool
+            WHERE source_id = ? AND kind = ? AND size >= ?
+            ORDER BY size, id
+            LIMIT 1
+            """, (source_id, kind, min_size)).fetchone()
+
+            if row:
+                conn.execute("DELETE FROM ready_pool WHERE id = ?", (row[0],))
+
+        return json.loads(row[1]) if row else None
+
+    except Exception as e:
+        print("❌ Pop ready pool error:", e)
+        return None
+
+
+def count_ready_items(source_id, kind, min_size):
+    with connection() as conn:
+        return conn.execute("""
+        SELECT COUNT(*)
+        FROM ready_pool
+        WHERE source_id = ? AND kind = ? AND size >= ?
+        """, (source_id, kind, min_size)).fetchone()[0]
+
+
+def delete_ready_items(source_id):
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM ready_pool WHERE source_id = ?", (source_id,)
+        ).rowcount
+
+
+def delete_orphan_ready_items(live_sources, grace_seconds=0):
+    """
+    Xoá bộ sinh sẵn của nguồn index không còn document nào tham chiếu (compaction)
+    Ứng viên được kiểm tra lại với DB trước khi xoá (confirm_orphan_sources)
+    """
+    with connection() as conn:
+        rows = conn.execute("SELECT DISTINCT source_id FROM ready_pool").fetchall()
+    orphans = confirm_orphan_sources(
+        [r[0] for r in rows if r[0] not in live_sources],
+        grace_seconds
+    )
+
+    return sum(delete_ready_items(source_id) for source_id in orphans)
@@ -1,49 +1,24 @@
-from database.db import get_connection
+from database.db import connection, transaction
 import hashlib
+import sqlite3
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def create_user_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE,
-        password TEXT
-    )
-    """)
-
-    conn.commit()
-    conn.close()
-
 def register_user(username, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-
     try:
-        cursor.execute(
-            "INSERT INTO users (username, password) VALUES (?, ?)",
-            (username, hash_password(password))
-        )
-        conn.commit()
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO users (username, password) VALUES (?, ?)",
+                (username, hash_password(password))
+            )
         return True
-    except:
+    except sqlite3.Error:
         return False
-    finally:
-        conn.close()
 
 def login_user(username, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT * FROM users WHERE username=? AND password=?",
-        (username, hash_password(password))
-    )
-
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    with connection() as conn:
+        return conn.execute(
+            "SELECT * FROM users WHERE username=? AND password=?",
+            (username, hash_password(password))
+        ).fetchone()
@@ -0,0 +1,40 @@
+from datetime import datetime
+from database.db import connection, transaction
+
+
+# =========================
+# BẢNG ĐỊNH TUYẾN: NGUỒN INDEX → COLLECTION CHROMA
+# =========================
+def get_partition(source_id):
+    with connection() as conn:
+        row = conn.execute("""
+        SELECT collection
+        FROM vector_partitions
+        WHERE source_id = ?
+        """, (source_id,)).fetchone()
+    return row[0] if row else None
+
+
+def set_partition(source_id, collection):
+    with transaction() as conn:
+        conn.execute("""
+        INSERT OR REPLACE INTO vector_partitions (source_id, collection, created_at)
+        VALUES (?, ?, ?)
+        """, (source_id, collection, datetime.now().strftime("%Y-%m-%d %H:%M")))
+
+
+def delete_partition(source_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM vector_partitions WHERE source_id = ?", (source_id,))
+
+
+def count_partition_sources(collection):
+    """
+    Số nguồn index còn nằm trong 1 collection (shard theo user dùng chung)
+    """
+    with connection() as conn:
+        return conn.execute("""
+        SELECT COUNT(*)
+        FROM vector_partitions
+        WHERE collection = ?
+        """, (collection,)).fetchone()[0]
@@ -4,6 +4,17 @@ from api.flashcard_api import router as flashcard_router
 from api.upload_api import router as upload_router
 from api.auth_api import router as auth_router
 from api.document_api import router as document_router
+from api.chat_api import router as chat_router
+from database.init_db import init_db
+from database.db import close_db
+from rag.ingest_queue import start_workers, stop_workers
+from rag.reaper import start_reaper, stop_reaper
+from agent.pregen import start_pregen, stop_pregen
+from utils.pdf_loader import shutdown_pool
+from rag.vector_store import warm_up, close_vector_db, get_embedding_stats
+from rag.query_embeddings import warm_up_queries, get_query_cache_stats
+from rag.retrieval_cache import get_retrieval_cache_stats
+from core.llm import get_llm_stats
 
 app = FastAPI(
     title="AI Study Agent Backend",
@@ -25,8 +36,47 @@ app.include_router(upload_router)
 app.include_router(flashcard_router)
 app.include_router(quiz_router)
 app.include_router(document_router)
+app.include_router(chat_router)
+
+
+@app.on_event("startup")
+def on_startup():
+    init_db()
+    warm_up()
+    start_workers()
+    start_reaper()
+    start_pregen()
+
+    try:
+        warm_up_queries()
+    except Exception as e:
+        # Không chặn startup khi embedding API lỗi → query sẽ được embed khi dùng
+        print("⚠️ Không warm-up được query embeddings:", e)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_workers()
+    stop_reaper()
+    stop_pregen()
+    shutdown_pool()
+    close_vector_db()
+    close_db()
 
 
 @app.get("/")
 def root():
     return {"message": "🚀 Backend is running"}
+
+
+@app.get("/stats")
+def stats():
+    """
+    Hit-rate các cache + throughput embedding
+    """
+    return {
+        "embedding": get_embedding_stats(),
+        "query_embedding": get_query_cache_stats(),
+        "retrieval": get_retrieval_cache_stats(),
+        "llm": get_llm_stats()
+    }
@@ -0,0 +1,112 @@
+"""
+Benchmark backend vector: Chroma vs NumPy memmap (không cần mạng)
+
+    cd backend && python -m rag.bench_backends [--docs 50] [--chunks 300] [--dim 1536]
+
+Mỗi backend chạy trong 1 process riêng để đo RSS độc lập.
+Dữ liệu: --docs document × --chunks chunk, vector ngẫu nhiên; đo latency search
+có filter theo 1 document (đúng kiểu truy vấn của retrieve_context_by_document).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class _FixedEmbeddings(Embeddings):
+    """
+    Trả về vector dựng sẵn theo thứ tự → không gọi API
+    """
+
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def embed_documents(self, texts):
+        return self.rng.standard_normal((len(texts), self.dim), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.rng.standard_normal(self.dim, dtype=np.float32).tolist()
+
+
+def _run_backend(backend: str, docs: int, chunks: int, dim: int, queries: int) -> dict:
+    embeddings = _FixedEmbeddings(dim)
+    root = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    rss_start = _rss_mb()
+
+    if backend == "numpy":
+        from rag.numpy_store import NumpyVectorStore
+        store = NumpyVectorStore(root, embeddings)
+    else:
+        import chromadb
+        from langchain_chroma import Chroma
+        store = Chroma(
+            client=chromadb.PersistentClient(path=root),
+            collection_name="bench",
+            embedding_function=embeddings
+        )
+
+    started = time.perf_counter()
+    for doc_id in range(1, docs + 1):
+        texts = [f"doc {doc_id} chunk {i}" for i in range(chunks)]
+        store.add_texts(texts=texts, metadatas=[{"document_id": doc_id}] * chunks)
+    index_seconds = time.perf_counter() - started
+
+    latencies = []
+    for q in range(queries):
+        vector = embeddings.embed_query("q")
+        doc_id = q % docs + 1
+        t = time.perf_counter()
+        store.similarity_search_by_vector(vector, k=8, filter={"document_id": doc_id})
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "index_seconds": round(index_seconds, 2),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "rss_mb": round(_rss_mb() - rss_start, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs NumPy backend")
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(_run_backend(args.backend, args.docs, args.chunks, args.dim, args.queries)))
+        sys.exit(0)
+
+    print(f"docs={args.docs} chunks/doc={args.chunks} dim={args.dim} queries={args.queries}")
+    print(f"{'backend':<8} {'index_s':>8} {'p50_ms':>8} {'p95_ms':>8} {'rss_mb':>8}")
+    for backend in ("chroma", "numpy"):
+        out = subprocess.run(
+            [sys.executable, "-m", "rag.bench_backends", "--backend", backend,
+             "--docs", str(args.docs), "--chunks", str(args.chunks),
+             "--dim", str(args.dim), "--queries", str(args.queries)],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{r['backend']:<8} {r['index_seconds']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['rss_mb']:>8}")
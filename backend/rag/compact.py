@@ -0,0 +1,171 @@
+"""
+Compaction: dọn vector / file / row mồ côi
+
+    cd backend && python -m rag.compact [--dry-run]
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+from api.upload_api import UPLOAD_DIR
+from rag.numpy_store import NUMPY_INDEX_PATH
+from rag.vector_store import (
+    CHROMA_DB_PATH,
+    VECTOR_BACKEND,
+    BACKEND_NUMPY,
+    get_numpy_store,
+    list_collections,
+    delete_collection,
+    iter_vector_metadata,
+    delete_vector_ids
+)
+from database.document import get_live_sources, get_referenced_files, confirm_orphan_sources
+from database.vector_partition import delete_partition
+from database.page_text import delete_orphan_pages
+from database.flashcard import delete_orphan_flashcard_sets
+from database.quiz import delete_orphan_quizzes
+from database.ready_pool import delete_orphan_ready_items
+
+# =====================
+# CONFIG
+# =====================
+# File mới ghi gần đây có thể là upload đang chạy (chưa kịp lưu row documents)
+ORPHAN_FILE_GRACE_SECONDS = int(os.getenv("ORPHAN_FILE_GRACE_SECONDS", "3600"))
+# Nguồn index có job vừa chạy trong khoảng này → chưa coi là mồ côi (server vẫn đang chạy)
+ORPHAN_SOURCE_GRACE_SECONDS = int(os.getenv("ORPHAN_SOURCE_GRACE_SECONDS", "3600"))
+
+
+def _dir_size(path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _modified_before(path: Path, cutoff: float) -> bool:
+    try:
+        return path.stat().st_mtime < cutoff
+    except OSError:
+        # file vừa bị xoá / đổi tên giữa chừng → không đụng tới
+        return False
+
+
+def compact(dry_run: bool = False) -> dict:
+    live_sources = get_live_sources()
+    chroma_before = _dir_size(CHROMA_DB_PATH)
+    numpy_before = _dir_size(NUMPY_INDEX_PATH)
+
+    # 1️⃣ Vector có document_id không còn document nào tham chiếu
+    # live_sources chỉ là ảnh chụp → gom ứng viên trước, kiểm tra lại với DB rồi mới xoá
+    candidates = {}          # collection → [(vector_id, source_id)]
+    kept = Counter()         # collection → số vector còn dùng
+    for collection in list_collections():
+        for vector_id, metadata in iter_vector_metadata(collection):
+            source_id = (metadata or {}).get("document_id")
+            if source_id in live_sources:
+                kept[collection] += 1
+            else:
+                candidates.setdefault(collection, []).append((vector_id, source_id))
+
+    numpy_candidates = []
+    if VECTOR_BACKEND == BACKEND_NUMPY:
+        store = get_numpy_store()
+        numpy_candidates = [s for s in store.list_sources() if s not in live_sources]
+
+    orphan_sources = confirm_orphan_sources(
+        [source_id for pairs in candidates.values() for _, source_id in pairs] + numpy_candidates,
+        ORPHAN_SOURCE_GRACE_SECONDS
+    )
+
+    orphan_vectors = 0
+    orphan_docs = Counter()
+    dropped_collections = []
+
+    for collection, pairs in candidates.items():
+        # metadata thiếu document_id (None) → luôn là mồ côi
+        orphan_ids = []
+        for vector_id, source_id in pairs:
+            if source_id is None or source_id in orphan_sources:
+                orphan_ids.append(vector_id)
+                orphan_docs[source_id] += 1
+            else:
+                kept[collection] += 1
+
+        orphan_vectors += len(orphan_ids)
+        if dry_run or not orphan_ids:
+            continue
+
+        if kept[collection] == 0 and collection.startswith("doc_"):
+            # Partition riêng của document đã xoá → drop cả collection
+            delete_collection(collection)
+            dropped_collections.append(collection)
+        else:
+            delete_vector_ids(orphan_ids, collection)
+
+    for source_id in numpy_candidates:
+        if source_id not in orphan_sources:
+            continue
+        count = store.count(source_id)
+        orphan_vectors += count
+        orphan_docs[source_id] += count
+        if not dry_run:
+            store.delete(where={"document_id": source_id})
+
+    if not dry_run:
+        for source_id in orphan_docs:
+            if source_id is not None:
+                delete_partition(source_id)
+
+    # 2️⃣ File PDF không còn được tham chiếu
+    # Bỏ qua *.part (upload đang ghi) + file mới sửa trong ORPHAN_FILE_GRACE_SECONDS
+    referenced = {os.path.abspath(p) for p in get_referenced_files()}
+    cutoff = time.time() - ORPHAN_FILE_GRACE_SECONDS
+    orphan_files = [
+        p for p in Path(UPLOAD_DIR).iterdir()
+        if p.is_file()
+        and p.suffix != ".part"
+        and os.path.abspath(p) not in referenced
+        and _modified_before(p, cutoff)
+    ]
+    file_bytes = sum(p.stat().st_size for p in orphan_files)
+    if not dry_run:
+        for p in orphan_files:
+            p.unlink(missing_ok=True)
+
+    # 3️⃣ Flashcard / quiz / text trang / bộ sinh sẵn của document đã xoá
+    rows = {"flashcard_sets": 0, "quizzes": 0, "pages": 0, "ready_pool": 0}
+    if not dry_run:
+        rows["flashcard_sets"] = delete_orphan_flashcard_sets()
+        rows["quizzes"] = delete_orphan_quizzes()
+        rows["pages"] = delete_orphan_pages(live_sources, ORPHAN_SOURCE_GRACE_SECONDS)
+        rows["ready_pool"] = delete_orphan_ready_items(live_sources, ORPHAN_SOURCE_GRACE_SECONDS)
+
+    return {
+        "dry_run": dry_run,
+        "orphan_vectors": orphan_vectors,
+        "orphan_documents": dict(orphan_docs),
+        "dropped_collections": dropped_collections,
+        "orphan_files": len(orphan_files),
+        "file_bytes_reclaimed": file_bytes,
+        "chroma_bytes_before": chroma_before,
+        "chroma_bytes_after": _dir_size(CHROMA_DB_PATH),
+        "numpy_bytes_before": numpy_before,
+        "numpy_bytes_after": _dir_size(NUMPY_INDEX_PATH),
+        "orphan_rows": rows
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dọn vector / file / row mồ côi")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo, không xoá")
+    args = parser.parse_args()
+
+    report = compact(dry_run=args.dry_run)
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# =====================
+# CONFIG
+# =====================
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.db")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Chuẩn hoá chunk trước khi hash: Unicode NFC + gộp khoảng trắng
+    → cùng 1 slide upload lại (khác xuống dòng / khoảng trắng) vẫn trúng cache
+    """
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(text: str, model: str) -> str:
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+# =====================
+# SQLITE STORE
+# =====================
+class EmbeddingCache:
+    """
+    Cache embedding dùng chung cho mọi document
+    key = sha256(model + chunk đã chuẩn hoá) → vector float32
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL
+        )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+
+        found = {}
+        conn = self._connect()
+        # SQLite giới hạn số tham số / câu lệnh → chia nhỏ
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            placeholders = ",".join("?" for _ in part)
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                part
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        conn.close()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]], model: str):
+        if not items:
+            return
+
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+            [
+                (key, model, len(vector), array("f", vector).tobytes())
+                for key, vector in items.items()
+            ]
+        )
+        conn.commit()
+        conn.close()
+
+    def record(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+
+# =====================
+# EMBEDDINGS WRAPPER
+# =====================
+class CachedEmbeddings(Embeddings):
+    """
+    Bọc 1 Embeddings bất kỳ: tra cache trước, chỉ gọi API cho chunk chưa có
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(t, self.model) for t in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        # Chunk trùng nhau trong cùng batch chỉ embed 1 lần
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh, self.model)
+            cached.update(fresh)
+
+        self.cache.record(hits=len(texts) - len(missing), misses=len(missing))
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
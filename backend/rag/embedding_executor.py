@@ -0,0 +1,174 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+# =====================
+# CONFIG
+# =====================
+EMBED_REQUEST_BATCH = int(os.getenv("EMBED_REQUEST_BATCH", "32"))   # chunk / 1 request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))        # request chạy song song
+EMBED_TPM_LIMIT = int(os.getenv("EMBED_TPM_LIMIT", "1000000"))      # token / phút
+EMBED_MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # Ước lượng rẻ (~3 ký tự / token với tiếng Việt), đủ cho việc giới hạn TPM
+    return len(text) // 3 + 1
+
+
+# =====================
+# GIỚI HẠN TOKEN / PHÚT
+# =====================
+class TokenRateLimiter:
+    """
+    Cửa sổ trượt 60s: chặn đến khi tổng token đã gửi trong 60s + token mới ≤ giới hạn
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._events = deque()   # (timestamp, tokens)
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and now - self._events[0][0] >= 60:
+                    self._used -= self._events.popleft()[1]
+
+                if self._used + tokens <= self.tokens_per_minute:
+                    self._events.append((now, tokens))
+                    self._used += tokens
+                    return
+
+                wait = 60 - (now - self._events[0][0])
+
+            time.sleep(max(wait, 0.05))
+
+
+# =====================
+# EMBEDDINGS CHẠY SONG SONG
+# =====================
+class ConcurrentEmbeddings(Embeddings):
+    """
+    Chia texts thành batch EMBED_REQUEST_BATCH, gửi song song (tối đa
+    EMBED_CONCURRENCY request), tôn trọng TPM, retry 429 / lỗi mạng
+    với exponential backoff + jitter
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = EMBED_REQUEST_BATCH,
+        concurrency: int = EMBED_CONCURRENCY,
+        tokens_per_minute: int = EMBED_TPM_LIMIT
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.limiter = TokenRateLimiter(tokens_per_minute)
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency,
+            thread_name_prefix="embed"
+        )
+
+        self._stats_lock = threading.Lock()
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+        self.retries = 0
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(t) for t in texts)
+
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            # Mỗi lần thử gửi lại cả batch → tính vào TPM mỗi lần
+            self.limiter.acquire(tokens)
+            try:
+                with self._semaphore:
+                    return self.embeddings.embed_documents(texts)
+            except RETRYABLE_ERRORS as e:
+                if attempt == EMBED_MAX_RETRIES:
+                    raise
+                delay = self._backoff(attempt, e)
+                with self._stats_lock:
+                    self.retries += 1
+                print(f"⚠️ Embedding retry {attempt + 1}/{EMBED_MAX_RETRIES} sau {delay:.1f}s:", e)
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        started = time.perf_counter()
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            results = list(self._pool.map(self._embed_batch, batches))
+
+        vectors = [v for batch in results for v in batch]
+
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.total_chunks += len(texts)
+            self.total_seconds += elapsed
+
+        print(
+            f"⚡ Embedded {len(texts)} chunks / {len(batches)} request "
+            f"trong {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-6):.1f} chunks/s)"
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "chunks": self.total_chunks,
+                "seconds": round(self.total_seconds, 2),
+                "chunks_per_second": round(
+                    self.total_chunks / self.total_seconds, 1
+                ) if self.total_seconds else 0.0,
+                "retries": self.retries
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,189 @@
+import abc
+import math
+import os
+import re
+import unicodedata
+import zlib
+from typing import List, Optional
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+# =====================
+# CONFIG
+# =====================
+# openai → OpenAI Embeddings API (mặc định)
+# local  → hashed n-gram chạy trên CPU, không cần mạng (CI, on-prem, benchmark)
+PROVIDER_OPENAI = "openai"
+PROVIDER_LOCAL = "local"
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", PROVIDER_OPENAI)
+
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+OPENAI_EMBEDDING_DIMS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+LOCAL_NGRAM_RANGE = (3, 5)     # n-gram ký tự trong từng từ
+LOCAL_NGRAM_WEIGHT = 0.5       # từ nguyên vẹn trọng số 1, n-gram ký tự 0.5
+
+# HTTP pool dùng chung cho mọi lần gọi embedding API
+HTTP_MAX_CONNECTIONS = 20
+HTTP_TIMEOUT = 60
+# Embed câu hỏi lúc search: hết hạn cùng lúc với VECTOR_SEARCH_TIMEOUT (rag.hybrid_search)
+# → API treo không giữ thread retrieval tới HTTP_TIMEOUT
+QUERY_HTTP_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "3"))
+
+
+# =====================
+# GIAO DIỆN PROVIDER
+# =====================
+class EmbeddingProvider(abc.ABC):
+    """
+    1 nguồn embedding: tạo Embeddings (LangChain) + khai báo model / số chiều
+    model + dim được ghi vào từng collection để không trộn vector của 2 model
+    remote=True → gọi API qua mạng (bọc ConcurrentEmbeddings + cache SQLite)
+    """
+
+    name = ""
+    remote = False
+
+    def __init__(self, model: str, dimension: Optional[int]):
+        self.model = model
+        self.dimension = dimension
+
+    @abc.abstractmethod
+    def create(self) -> Embeddings:
+        ...
+
+    def create_query(self) -> Embeddings:
+        """
+        Embeddings cho câu hỏi lúc search (mặc định giống create)
+        """
+        return self.create()
+
+    def signature(self) -> dict:
+        return {"embedding_model": self.model, "embedding_dim": self.dimension}
+
+    def close(self):
+        pass
+
+
+class OpenAIProvider(EmbeddingProvider):
+    name = PROVIDER_OPENAI
+    remote = True
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL):
+        super().__init__(model, OPENAI_EMBEDDING_DIMS.get(model))
+        self._http_client = None
+
+    def _get_http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS
+                ),
+                timeout=HTTP_TIMEOUT
+            )
+        return self._http_client
+
+    def create(self) -> Embeddings:
+        # Retry 429 do ConcurrentEmbeddings đảm nhận (có backoff + jitter)
+        return OpenAIEmbeddings(
+            model=self.model,
+            http_client=self._get_http_client(),
+            max_retries=0
+        )
+
+    def create_query(self) -> Embeddings:
+        # Dùng chung HTTP pool, timeout ngắn, không retry: quá hạn → hybrid search chỉ dùng BM25
+        return OpenAIEmbeddings(
+            model=self.model,
+            http_client=self._get_http_client(),
+            timeout=QUERY_HTTP_TIMEOUT,
+            max_retries=0
+        )
+
+    def close(self):
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+
+class LocalHashingProvider(EmbeddingProvider):
+    name = PROVIDER_LOCAL
+
+    def __init__(self, dimension: int = LOCAL_EMBEDDING_DIM):
+        super().__init__(f"local-hash-{dimension}", dimension)
+
+    def create(self) -> Embeddings:
+        return HashingEmbeddings(self.dimension, model=self.model)
+
+
+# =====================
+# LOCAL: HASHED N-GRAM
+# =====================
+_WORD_RE = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    # bỏ dấu tiếng Việt để "mạng" / "mang" gần nhau (giống FTS5 remove_diacritics)
+    text = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature hashing (kiểu HashingVectorizer): từ + n-gram ký tự → CRC32 → bucket có dấu
+    TF sublinear (1 + log tf), chuẩn hoá L2 → cosine ≈ độ trùng từ vựng
+    Tất định, không cần mạng / model trên đĩa, ~ vài nghìn chunk/s trên 1 core
+    """
+
+    def __init__(self, dimension: int = LOCAL_EMBEDDING_DIM, model: Optional[str] = None):
+        self.dimension = dimension
+        self.model = model or f"local-hash-{dimension}"
+
+    def _features(self, text: str) -> dict:
+        counts = {}
+        low, high = LOCAL_NGRAM_RANGE
+        for word in _WORD_RE.findall(_fold(text)):
+            counts[word] = counts.get(word, 0.0) + 1.0
+
+            padded = f"<{word}>"
+            for n in range(low, min(high, len(padded)) + 1):
+                for i in range(len(padded) - n + 1):
+                    gram = "#" + padded[i:i + n]
+                    counts[gram] = counts.get(gram, 0.0) + LOCAL_NGRAM_WEIGHT
+        return counts
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, tf in self._features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = -1.0 if h & 0x80000000 else 1.0
+            weight = 1.0 + math.log(tf) if tf > 1 else tf
+            vector[h % self.dimension] += sign * weight
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def get_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name == PROVIDER_OPENAI:
+        return OpenAIProvider()
+    if name == PROVIDER_LOCAL:
+        return LocalHashingProvider()
+    raise ValueError(f"❌ EMBEDDING_PROVIDER không hợp lệ: {name} (openai | local)")
@@ -0,0 +1,91 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List, Optional, Tuple
+
+from rag.vector_store import load_vector_db, partition_filter
+from rag.embeddings import QUERY_HTTP_TIMEOUT
+from rag.query_embeddings import embed_query
+from rag.embedding_cache import normalize_text
+from database.page_text import search_chunks
+
+# =====================
+# CONFIG
+# =====================
+# hybrid  → BM25 (FTS5) + vector, hợp nhất bằng RRF (mặc định)
+# vector  → chỉ vector search
+# lexical → chỉ BM25 (không gọi embedding API)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Quá thời gian này vector search bị bỏ qua → chỉ dùng kết quả lexical
+# (cùng biến môi trường với HTTP timeout khi embed câu hỏi)
+VECTOR_SEARCH_TIMEOUT = QUERY_HTTP_TIMEOUT
+RRF_K = 60
+CANDIDATE_FACTOR = 2     # mỗi nhánh lấy k * CANDIDATE_FACTOR ứng viên
+
+# Pool riêng cho vector search (gọi embedding API); BM25 chạy ngay trên thread gọi
+# → API embedding treo làm đầy pool này cũng không làm chậm nhánh lexical
+_vector_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vector-search")
+
+
+def _vector_search(source_id: int, query: str, k: int) -> List[str]:
+    vectordb = load_vector_db(source_id)
+    docs = vectordb.similarity_search_by_vector(
+        embed_query(query),
+        k=k,
+        filter=partition_filter(source_id)
+    )
+    return [doc.page_content for doc in docs]
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> List[str]:
+    """
+    score(chunk) = Σ 1 / (k + rank) trên mọi danh sách chứa chunk đó
+    """
+    scores = {}
+    texts = {}
+    for ranking in rankings:
+        for rank, text in enumerate(ranking, start=1):
+            key = normalize_text(text)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            texts.setdefault(key, text)
+
+    return [texts[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def hybrid_search(
+    source_id: int,
+    query: str,
+    k: int,
+    lexical_query: Optional[str] = None
+) -> Tuple[List[str], bool]:
+    """
+    BM25 (thread gọi) song song vector search (pool riêng) trên chunk của source_id rồi hợp nhất RRF
+
+    lexical_query: câu cho BM25 (vd câu hỏi gốc của user, không kèm template)
+    Trả về (chunks, degraded) – degraded=True khi nhánh vector lỗi / quá hạn
+    """
+    candidates = k * CANDIDATE_FACTOR
+
+    if RETRIEVAL_MODE == "vector":
+        return _vector_search(source_id, query, k), False
+
+    if RETRIEVAL_MODE == "lexical":
+        return search_chunks(source_id, lexical_query or query, candidates)[:k], False
+
+    started = time.monotonic()
+    vector_future = _vector_pool.submit(_vector_search, source_id, query, candidates)
+    lexical = search_chunks(source_id, lexical_query or query, candidates)
+
+    degraded = False
+    try:
+        remaining = VECTOR_SEARCH_TIMEOUT - (time.monotonic() - started)
+        dense = vector_future.result(timeout=max(remaining, 0))
+    except TimeoutError:
+        vector_future.cancel()
+        print(f"⚠️ Vector search > {VECTOR_SEARCH_TIMEOUT}s → chỉ dùng BM25")
+        dense, degraded = [], True
+    except Exception as e:
+        print("⚠️ Vector search lỗi → chỉ dùng BM25:", e)
+        dense, degraded = [], True
+
+    return reciprocal_rank_fusion(dense, lexical)[:k], degraded
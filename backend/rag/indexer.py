@@ -1,27 +1,103 @@
-from rag.text_splitter import split_text
-from rag.vector_store import create_vector_db
+from typing import Callable, Iterable, Iterator, Optional
 
+from rag.text_splitter import split_stream
+from rag.vector_store import create_vector_db, delete_vectors, get_embedding_stats
+from core.tokens import count_tokens, text_key
+from database.page_text import (
+    save_pages,
+    delete_pages,
+    save_chunks,
+    delete_chunks,
+    save_chunk_tokens
+)
 
-def index_document(
-    text: str,
-    document_id: int
+# =====================
+# CONFIG
+# =====================
+# Số chunk ghi vào vector DB / lần; mỗi lần được chia tiếp thành các
+# request embedding chạy song song (xem rag.embedding_executor)
+EMBED_BATCH_SIZE = 256
+PAGE_TEXT_BATCH_SIZE = 50
+
+
+def persist_pages(pages: Iterable[str], document_id: int) -> Iterator[str]:
+    """
+    Cho trang đi tiếp trong pipeline, đồng thời lưu text vào FTS5 (page_text)
+    theo batch → tìm kiếm từ khoá + re-chunk / re-embed không cần parse lại PDF
+    """
+    delete_pages(document_id)
+    batch = []
+
+    for page_no, text in enumerate(pages):
+        batch.append((page_no, text))
+        if len(batch) >= PAGE_TEXT_BATCH_SIZE:
+            save_pages(document_id, batch)
+            batch.clear()
+        yield text
+
+    if batch:
+        save_pages(document_id, batch)
+
+
+def index_pages(
+    pages: Iterable[str],
+    document_id: int,
+    on_batch: Optional[Callable[[int], None]] = None
 ) -> int:
     """
-    Chunk → Embed → Lưu ChromaDB
-    Gắn document_id cho từng chunk
+    Stream: trang → chunk → embed → lưu ChromaDB theo batch cố định
+    Trang được split ngay khi extract xong, mỗi EMBED_BATCH_SIZE chunk
+    được embed + ghi luôn → RAM không phụ thuộc kích thước PDF
+    Chunk cũng được ghi vào FTS5 (chunk_text) cho hybrid retrieval, kèm số token
+
+    on_batch(total_chunks_so_far) được gọi sau mỗi batch
+    Chạy lại (job dở dang sau restart, re-index) → xoá chunk + vector cũ trước batch đầu,
+    tránh nhân đôi vector trong ChromaDB
     """
+    delete_chunks(document_id)
+    delete_vectors(document_id)
+    batch = []
+    total = 0
+
+    def flush():
+        nonlocal total
+        create_vector_db(
+            text_chunks=batch,
+            document_id=document_id
+        )
+        save_chunks(document_id, list(enumerate(batch, start=total)))
+        keys = [text_key(chunk) for chunk in batch]
+        save_chunk_tokens(document_id, [
+            (key, count_tokens(chunk, key))
+            for chunk, key in zip(batch, keys)
+        ])
+        total += len(batch)
+        batch.clear()
+        if on_batch:
+            on_batch(total)
+
+    for chunk in split_stream(pages):
+        batch.append(chunk)
+        if len(batch) >= EMBED_BATCH_SIZE:
+            flush()
 
-    # 1️⃣ Chia văn bản thành chunks
-    chunks = split_text(text)
+    if batch:
+        flush()
 
-    if not chunks:
+    if not total:
         raise ValueError("❌ Không có chunk để index")
 
-    # 2️⃣ Lưu vào vector DB (🔥 có document_id)
-    create_vector_db(
-        text_chunks=chunks,
-        document_id=document_id
-    )
+    print(f"✅ Indexed {total} chunks cho document_id={document_id}")
+    print("📦 Embedding:", get_embedding_stats())
+    return total
 
-    print(f"✅ Indexed {len(chunks)} chunks cho document_id={document_id}")
-    return len(chunks)
+
+def index_document(
+    text: str,
+    document_id: int
+) -> int:
+    """
+    Chunk → Embed → Lưu ChromaDB
+    Gắn document_id cho từng chunk
+    """
+    return index_pages([text], document_id)
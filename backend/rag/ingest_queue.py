@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+
+from rag.indexer import index_pages, persist_pages
+from rag.retrieval_cache import invalidate_document
+from rag.reaper import enqueue_reap
+from agent.pregen import schedule_refill
+from utils.pdf_loader import iter_pages, probe_engine, count_pages
+from database.document import (
+    set_document_status,
+    get_live_document_for_source,
+    INDEX_INDEXING,
+    INDEX_READY,
+    INDEX_FAILED
+)
+from database.ready_pool import delete_ready_items
+from database.ingest_job import (
+    create_ingest_job,
+    update_ingest_job,
+    get_unfinished_ingest_jobs,
+    JOB_RUNNING,
+    JOB_DONE,
+    JOB_FAILED
+)
+
+# =====================
+# CONFIG
+# =====================
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# Tỉ trọng tiến độ của từng stage
+# extract → split → embed chạy chồng lên nhau (stream) nên "embedding"
+# được tính theo số trang đã đi qua pipeline
+STAGE_WEIGHTS = {
+    "extracting": (0.0, 0.05),
+    "embedding": (0.05, 0.95),
+    "storing": (0.95, 1.0),
+}
+
+_queue: "queue.Queue[tuple[str, int, str] | None]" = queue.Queue()
+_workers: list[threading.Thread] = []
+_lock = threading.Lock()
+
+
+class IngestCancelled(Exception):
+    """
+    Document (và mọi bản upload trùng) đã bị xoá trong lúc job chờ / đang chạy
+    """
+
+
+def _progress(stage: str, done: int, total: int) -> float:
+    start, end = STAGE_WEIGHTS[stage]
+    ratio = done / total if total else 1.0
+    return round(start + (end - start) * ratio, 3)
+
+
+# =====================
+# PIPELINE CỦA 1 JOB
+# =====================
+def _ensure_live(document_id: int):
+    # Nguồn index còn được dùng khi còn document gốc hoặc 1 bản upload trùng
+    if get_live_document_for_source(document_id) is None:
+        raise IngestCancelled(f"document_id={document_id} đã bị xoá")
+
+
+def _run_job(job_id: str, document_id: int, filepath: str):
+    _ensure_live(document_id)
+    update_ingest_job(job_id, status=JOB_RUNNING, stage="extracting", progress=0)
+    set_document_status(document_id, INDEX_INDEXING)
+    invalidate_document(document_id)
+    delete_ready_items(document_id)
+
+    # 1️⃣ Probe engine + đếm trang
+    engine = probe_engine(filepath)
+    total_pages = count_pages(filepath)
+    update_ingest_job(job_id, progress=_progress("extracting", 1, 1))
+
+    # 2️⃣ Stream: extract → (lưu text FTS) → split → embed (theo batch)
+    pages_done = 0
+
+    def on_page(done, total):
+        nonlocal pages_done
+        pages_done = done
+
+    def on_batch(chunks_done):
+        # Xoá giữa chừng → dừng ngay sau batch vừa ghi, không index tiếp cho nguồn đã mất
+        _ensure_live(document_id)
+        update_ingest_job(
+            job_id,
+            stage="embedding",
+            progress=_progress("embedding", pages_done, total_pages),
+            total_chunks=chunks_done
+        )
+
+    pages = persist_pages(
+        iter_pages(filepath, engine=engine, on_progress=on_page),
+        document_id=document_id
+    )
+    total_chunks = index_pages(
+        pages,
+        document_id=document_id,
+        on_batch=on_batch
+    )
+
+    # 3️⃣ Store → đánh dấu document sẵn sàng
+    _ensure_live(document_id)
+    update_ingest_job(job_id, stage="storing", progress=_progress("storing", 0, 1))
+    set_document_status(document_id, INDEX_READY)
+    invalidate_document(document_id)
+    update_ingest_job(
+        job_id,
+        status=JOB_DONE,
+        stage=JOB_DONE,
+        progress=1.0,
+        total_chunks=total_chunks
+    )
+
+    # 4️⃣ (tuỳ chọn) sinh sẵn quiz + flashcard mặc định ở nền
+    schedule_refill(document_id)
+
+
+def _worker_loop():
+    while True:
+        item = _queue.get()
+        if item is None:
+            _queue.task_done()
+            break
+
+        job_id, document_id, filepath = item
+        try:
+            _run_job(job_id, document_id, filepath)
+        except IngestCancelled as e:
+            # Reaper có thể đã dọn trước khi job ghi xong → dọn lại phần job đã ghi
+            print(f"🛑 Ingest job {job_id} dừng: {e}")
+            enqueue_reap(document_id, document_id, filepath)
+        except Exception as e:
+            print(f"❌ Ingest job {job_id} lỗi:", e)
+            set_document_status(document_id, INDEX_FAILED)
+            update_ingest_job(job_id, status=JOB_FAILED, error=str(e))
+        finally:
+            _queue.task_done()
+
+
+# =====================
+# PUBLIC API
+# =====================
+def enqueue_ingest(job_id: str, document_id: int, filepath: str):
+    """
+    Tạo job + đẩy vào hàng đợi, trả về ngay
+    """
+    create_ingest_job(job_id, document_id, filepath)
+    _queue.put((job_id, document_id, filepath))
+
+
+def start_workers():
+    """
+    Khởi động worker pool + nạp lại job dang dở (sau khi restart)
+    """
+    with _lock:
+        if _workers:
+            return
+
+        for job_id, document_id, filepath in get_unfinished_ingest_jobs():
+            _queue.put((job_id, document_id, filepath))
+
+        for i in range(INGEST_WORKERS):
+            t = threading.Thread(
+                target=_worker_loop,
+                name=f"ingest-worker-{i}",
+                daemon=True
+            )
+            t.start()
+            _workers.append(t)
+
+    print(f"✅ Ingest workers started: {INGEST_WORKERS}")
+
+
+def stop_workers():
+    with _lock:
+        for _ in _workers:
+            _queue.put(None)
+        _workers.clear()
@@ -0,0 +1,114 @@
+"""
+Chuyển chunk từ collection chung sang partition (theo document / theo user)
+
+    cd backend && python -m rag.migrate_partitions --mode document [--dry-run]
+"""
+import argparse
+from collections import Counter
+
+from rag.vector_store import (
+    COLLECTION_NAME,
+    VECTOR_PARTITION_MODE,
+    PARTITION_GLOBAL,
+    PARTITION_DOCUMENT,
+    PARTITION_USER,
+    get_collection_store,
+    iter_vector_metadata,
+    partition_name
+)
+from rag.retrieval_cache import invalidate_document
+from database.vector_partition import get_partition, set_partition
+
+BATCH_SIZE = 500
+
+
+def _copy_source(source_id: int, target: str) -> int:
+    """
+    Copy toàn bộ chunk (kèm embedding, không embed lại) của 1 nguồn sang target
+    """
+    source = get_collection_store(COLLECTION_NAME)._collection
+    dest = get_collection_store(target)._collection
+
+    copied = 0
+    offset = 0
+    while True:
+        page = source.get(
+            where={"document_id": source_id},
+            include=["embeddings", "documents", "metadatas"],
+            limit=BATCH_SIZE,
+            offset=offset
+        )
+        ids = page["ids"]
+        if not ids:
+            break
+
+        # upsert → chạy lại sau khi bị ngắt giữa chừng vẫn an toàn
+        dest.upsert(
+            ids=ids,
+            embeddings=page["embeddings"],
+            documents=page["documents"],
+            metadatas=page["metadatas"]
+        )
+        copied += len(ids)
+        offset += len(ids)
+
+    return copied
+
+
+def migrate(mode: str, dry_run: bool = False) -> dict:
+    if mode == PARTITION_GLOBAL:
+        raise SystemExit("❌ VECTOR_PARTITION_MODE=global: không có gì để migrate")
+
+    sources = Counter(
+        (metadata or {}).get("document_id")
+        for _, metadata in iter_vector_metadata(COLLECTION_NAME)
+    )
+    sources.pop(None, None)
+
+    moved = {}
+    for source_id, count in sorted(sources.items()):
+        # Route đã trỏ sang partition (lần chạy trước bị ngắt sau bước 2) → chỉ dọn bản cũ
+        current = get_partition(source_id)
+        already_routed = current not in (None, COLLECTION_NAME)
+        target = current if already_routed else partition_name(source_id, mode)
+        if target == COLLECTION_NAME:
+            continue
+
+        if dry_run:
+            moved[source_id] = {"collection": target, "chunks": count}
+            continue
+
+        # 1️⃣ copy → 2️⃣ đổi route (search chuyển sang partition) → 3️⃣ xoá bản cũ
+        copied = 0
+        if not already_routed:
+            copied = _copy_source(source_id, target)
+            set_partition(source_id, target)
+        get_collection_store(COLLECTION_NAME).delete(where={"document_id": source_id})
+        invalidate_document(source_id)
+
+        moved[source_id] = {"collection": target, "chunks": copied}
+        print(f"✅ document_id={source_id}: {copied} chunks → {target}")
+
+    return {
+        "mode": mode,
+        "dry_run": dry_run,
+        "sources": len(moved),
+        "chunks": sum(m["chunks"] for m in moved.values()),
+        "moved": moved
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chuyển chunk sang partition")
+    parser.add_argument(
+        "--mode",
+        choices=[PARTITION_DOCUMENT, PARTITION_USER],
+        default=VECTOR_PARTITION_MODE if VECTOR_PARTITION_MODE != PARTITION_GLOBAL else PARTITION_DOCUMENT
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo, không chuyển")
+    args = parser.parse_args()
+
+    report = migrate(args.mode, dry_run=args.dry_run)
+    for key, value in report.items():
+        if key != "moved":
+            print(f"{key}: {value}")
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.cache import LRUCache
+
+# =====================
+# CONFIG
+# =====================
+NUMPY_INDEX_PATH = "data/numpy_index"
+# Số nguồn giữ text + metadata trong RAM (LRU) – không tăng theo mọi document từng được search
+NUMPY_TEXT_CACHE_SIZE = int(os.getenv("NUMPY_TEXT_CACHE_SIZE", "64"))
+
+
+class NumpyVectorStore:
+    """
+    Backend brute-force cho index nhỏ theo document (vài trăm chunk)
+    Mỗi nguồn index (document_id) gồm:
+    - {id}.f32   : ma trận float32 (đã chuẩn hoá L2), ghi nối tiếp, đọc bằng memmap
+    - {id}.jsonl : text + metadata của từng chunk (cùng thứ tự hàng)
+    - {id}.json  : {"dim", "count", "model"} – count chỉ tăng sau khi dữ liệu đã ghi xong
+
+    Cosine = 1 phép nhân ma trận–vector trên memmap, không qua lớp persistence của Chroma
+    Giao diện giống phần Chroma mà app đang dùng (add_texts / similarity_search* / delete)
+    """
+
+    def __init__(self, root: str, embedding_function, model: Optional[str] = None):
+        self.root = root
+        self.embedding_function = embedding_function
+        self.model = model
+        self._lock = threading.Lock()
+        self._texts = LRUCache(maxsize=NUMPY_TEXT_CACHE_SIZE)   # source_id → (count, texts, metadatas)
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- FILES ----------
+    def _path(self, source_id: int, ext: str) -> str:
+        return os.path.join(self.root, f"{source_id}.{ext}")
+
+    def _meta(self, source_id: int) -> Optional[dict]:
+        try:
+            with open(self._path(source_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, source_id: int, meta: dict):
+        tmp = self._path(source_id, "json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(source_id, "json"))
+
+    def _check_model(self, source_id: int, meta: dict):
+        recorded = meta.get("model")
+        if recorded and self.model and recorded != self.model:
+            raise RuntimeError(
+                f"❌ Document {source_id} được index bằng {recorded} "
+                f"(dim={meta['dim']}), provider hiện tại là {self.model}"
+            )
+
+    def _matrix(self, source_id: int):
+        meta = self._meta(source_id)
+        if not meta or not meta["count"]:
+            return None, 0
+        self._check_model(source_id, meta)
+        matrix = np.memmap(
+            self._path(source_id, "f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["count"], meta["dim"])
+        )
+        return matrix, meta["count"]
+
+    def _load_texts(self, source_id: int, count: int):
+        cached = self._texts.get(source_id)
+        if cached and cached[0] == count:
+            return cached[1], cached[2]
+
+        texts, metadatas = [], []
+        with open(self._path(source_id, "jsonl"), encoding="utf-8") as f:
+            for line in f:
+                if len(texts) == count:
+                    break
+                row = json.loads(line)
+                texts.append(row["text"])
+                metadatas.append(row["metadata"])
+
+        self._texts.set(source_id, (count, texts, metadatas))
+        return texts, metadatas
+
+    def count(self, source_id: int) -> int:
+        meta = self._meta(source_id)
+        return meta["count"] if meta else 0
+
+    def list_sources(self) -> List[int]:
+        return sorted(
+            int(name[:-5]) for name in os.listdir(self.root)
+            if name.endswith(".json") and name[:-5].isdigit()
+        )
+
+    # ---------- WRITE ----------
+    def add_texts(self, texts: List[str], metadatas: List[dict], **kwargs) -> List[str]:
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        ids = [str(uuid.uuid4()) for _ in texts]
+        groups: Dict[int, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(metadata["document_id"], []).append(i)
+
+        with self._lock:
+            for source_id, rows in groups.items():
+                meta = self._meta(source_id) or {
+                    "dim": vectors.shape[1], "count": 0, "model": self.model
+                }
+                self._check_model(source_id, meta)
+                if meta["dim"] != vectors.shape[1]:
+                    raise ValueError(
+                        f"❌ Sai số chiều embedding: {vectors.shape[1]} ≠ {meta['dim']}"
+                    )
+
+                with open(self._path(source_id, "f32"), "ab") as f:
+                    f.write(vectors[rows].tobytes())
+                with open(self._path(source_id, "jsonl"), "a", encoding="utf-8") as f:
+                    for i in rows:
+                        f.write(json.dumps(
+                            {"id": ids[i], "text": texts[i], "metadata": metadatas[i]},
+                            ensure_ascii=False
+                        ) + "\n")
+
+                meta["count"] += len(rows)
+                self._write_meta(source_id, meta)
+
+        return ids
+
+    def delete(self, ids=None, where: Optional[dict] = None, **kwargs):
+        if not where or "document_id" not in where:
+            raise ValueError("❌ NumpyVectorStore chỉ hỗ trợ xoá theo document_id")
+
+        source_id = where["document_id"]
+        with self._lock:
+            self._texts.pop(source_id)
+            for ext in ("json", "f32", "jsonl"):
+                try:
+                    os.remove(self._path(source_id, ext))
+                except FileNotFoundError:
+                    pass
+
+    # ---------- SEARCH ----------
+    def _search_source(self, source_id: int, query: np.ndarray, k: int):
+        matrix, count = self._matrix(source_id)
+        if matrix is None:
+            return []
+
+        scores = matrix @ query
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        texts, metadatas = self._load_texts(source_id, count)
+        return [
+            (float(scores[i]), Document(page_content=texts[i], metadata=metadatas[i]))
+            for i in top
+        ]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs
+    ) -> List[Document]:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if filter and "document_id" in filter:
+            sources = [filter["document_id"]]
+        else:
+            sources = self.list_sources()
+
+        results = []
+        for source_id in sources:
+            results.extend(self._search_source(source_id, query, k))
+
+        results.sort(key=lambda r: r[0], reverse=True)
+        return [doc for _, doc in results[:k]]
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding_function.embed_query(query),
+            k=k,
+            filter=filter
+        )
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Optional
+
+from core.cache import LRUCache
+from rag.embedding_cache import EMBEDDING_CACHE_PATH, cache_key
+from rag.vector_store import get_embeddings, get_query_embeddings
+
+# =====================
+# CONFIG
+# =====================
+QUERY_CACHE_SIZE = 2048
+QUERY_EMBEDDING_TTL = int(os.getenv("QUERY_EMBEDDING_TTL", str(24 * 3600)))
+
+# Query cố định của agent: embed 1 lần lúc startup, không hết hạn
+_static_queries: List[str] = []
+_pinned = {}
+
+# Câu hỏi của user: LRU trong RAM, có TTL, backed bởi SQLite
+_memory = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_EMBEDDING_TTL)
+_db_lock = threading.Lock()
+_db_ready = False
+
+
+def _connect():
+    global _db_ready
+
+    conn = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False, timeout=30)
+    if not _db_ready:
+        with _db_lock:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+            conn.commit()
+            _db_ready = True
+    return conn
+
+
+def _load_from_disk(key: str, ttl: Optional[float]) -> Optional[List[float]]:
+    conn = _connect()
+    row = conn.execute(
+        "SELECT vector, created_at FROM query_embeddings WHERE key = ?",
+        (key,)
+    ).fetchone()
+    conn.close()
+
+    if row is None:
+        return None
+    if ttl is not None and time.time() - row[1] > ttl:
+        return None
+    return array("f", row[0]).tolist()
+
+
+def _save_to_disk(key: str, vector: List[float]):
+    conn = _connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+        (key, array("f", vector).tobytes(), time.time())
+    )
+    conn.commit()
+    conn.close()
+
+
+# =====================
+# PUBLIC API
+# =====================
+def embed_query(text: str) -> List[float]:
+    """
+    Embedding của query, chỉ gọi API khi chưa có trong RAM / disk
+    """
+    embeddings = get_embeddings()
+    key = cache_key(text, embeddings.model)
+
+    vector = _pinned.get(key)
+    if vector is not None:
+        return vector
+
+    vector = _memory.get(key)
+    if vector is not None:
+        return vector
+
+    vector = _load_from_disk(key, QUERY_EMBEDDING_TTL)
+    if vector is None:
+        vector = get_query_embeddings().embed_query(text)
+        _save_to_disk(key, vector)
+
+    _memory.set(key, vector)
+    return vector
+
+
+def register_static_query(text: str) -> str:
+    """
+    Đăng ký query cố định của agent → được embed sẵn lúc startup
+    """
+    if text not in _static_queries:
+        _static_queries.append(text)
+    return text
+
+
+def warm_up_queries():
+    """
+    Embed toàn bộ query cố định (ưu tiên lấy từ disk, không TTL)
+    """
+    embeddings = get_embeddings()
+
+    for text in _static_queries:
+        key = cache_key(text, embeddings.model)
+        vector = _load_from_disk(key, ttl=None)
+        if vector is None:
+            vector = embeddings.embed_query(text)
+            _save_to_disk(key, vector)
+        _pinned[key] = vector
+
+    print(f"✅ Query embeddings ready: {len(_pinned)} query cố định")
+
+
+def get_query_cache_stats() -> dict:
+    return {
+        "pinned": len(_pinned),
+        "memory": _memory.stats()
+    }
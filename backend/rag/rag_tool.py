@@ -1,76 +1,182 @@
+import asyncio
+from typing import List, Optional
+
 from rag.vector_store import load_vector_db
-from core.llm import client
+from rag.query_embeddings import embed_query
+from rag.hybrid_search import hybrid_search
+from rag.retrieval_cache import make_key, get_cached_context, set_cached_context
+from core.tokens import (
+    count_tokens,
+    count_message_tokens,
+    context_budget,
+    remember_tokens,
+    text_key
+)
+from database.document import get_index_source
+from database.page_text import get_chunk_tokens
 
 # =====================
 # CONFIG
 # =====================
-MAX_CONTEXT_CHARS = 4000
+MAX_CONTEXT_TOKENS = 1200     # ngân sách mặc định khi agent không truyền max_tokens
+SEPARATOR_TOKENS = 1          # "\n\n" giữa 2 chunk
 MIN_CONTEXT_CHARS = 200
 MIN_CHUNK_LENGTH = 40
 
+RAG_ANSWER_TEMPERATURE = 0.1
+RAG_ANSWER_TOKEN_BUDGET = 3000    # cả request: prompt + ngữ cảnh + câu trả lời
+RAG_ANSWER_OUTPUT_TOKENS = 600
+NO_ANSWER_MESSAGE = "Không tìm thấy thông tin trong tài liệu."
+
+RAG_ANSWER_QUERY_TEMPLATE = """
+    Khái niệm, định nghĩa, nguyên lý, công thức,
+    nội dung học tập quan trọng liên quan đến:
+    {question}
+    """
+
+
+# ======================================================
+# GHÉP NGỮ CẢNH THEO NGÂN SÁCH TOKEN
+# ======================================================
+def load_chunk_tokens(source_id: int, chunks: List[str]) -> List[int]:
+    """
+    Số token của từng chunk: lấy bản đã tính lúc index, chunk cũ chưa có thì đếm ngay
+    """
+    keys = [text_key(chunk) for chunk in chunks]
+    stored = get_chunk_tokens(source_id, keys)
+
+    counts = []
+    for chunk, key in zip(chunks, keys):
+        if key in stored:
+            remember_tokens(key, stored[key])
+            counts.append(stored[key])
+        else:
+            counts.append(count_tokens(chunk, key))
+    return counts
+
+
+def pack_chunks(chunks: List[str], tokens: List[int], budget: int):
+    """
+    Greedy theo thứ hạng: lấy chunk nếu còn vừa ngân sách, chunk quá lớn thì bỏ qua
+    và thử chunk sau (chunk nhỏ hơn vẫn có thể lấp chỗ trống)
+    Trả về (chunks đã chọn, số token đã dùng)
+    """
+    picked = []
+    used = 0
+    for chunk, n in zip(chunks, tokens):
+        cost = n + (SEPARATOR_TOKENS if picked else 0)
+        if used + cost > budget:
+            continue
+        picked.append(chunk)
+        used += cost
+    return picked, used
+
 
 # ======================================================
 # CORE: RETRIEVE CONTEXT BY DOCUMENT_ID (🔥 QUAN TRỌNG)
 # ======================================================
-def retrieve_context_by_document(
+def retrieve_chunks_by_document(
     document_id: int,
     query: str,
-    k: int = 6
-) -> str:
+    k: int = 6,
+    lexical_query: Optional[str] = None,
+    max_tokens: int = MAX_CONTEXT_TOKENS
+) -> List[str]:
     """
-    Lấy ngữ cảnh học tập từ VectorDB (RAG)
+    Lấy các chunk ngữ cảnh học tập (RAG: BM25 + vector, hợp nhất RRF)
     → CHỈ LẤY CHUNK CỦA document_id ĐƯỢC CHỌN
+    (file upload trùng dùng chung chunk của document nguồn)
+
+    lexical_query: câu dùng cho BM25 nếu khác query (vd câu hỏi gốc)
+    max_tokens: ngân sách token cho ngữ cảnh (xem core.tokens.context_budget)
+    Trả về [] nếu không đủ ngữ cảnh
     """
 
-    try:
-        vectordb = load_vector_db()
+    source_id = get_index_source(document_id)
 
-        docs = vectordb.similarity_search(
-            query,
-            k=k,
-            filter={
-                "document_id": document_id
-            }
-        )
+    cache_key = make_key(source_id, query, k, lexical_query, max_tokens)
+    cached = get_cached_context(cache_key)
+    if cached is not None:
+        return list(cached)
 
+    try:
+        chunks, degraded = hybrid_search(source_id, query, k, lexical_query)
     except Exception as e:
         print("❌ RAG search error:", e)
-        return ""
+        return []
 
-    if not docs:
+    if not chunks:
         print(f"⚠️ RAG: Không tìm thấy chunk cho document_id={document_id}")
-        return ""
-
-    contexts = []
-    total_chars = 0
-
-    for doc in docs:
-        content = doc.page_content.strip()
-
-        if not content:
-            continue
-
-        if len(content) < MIN_CHUNK_LENGTH:
-            continue
-
-        contexts.append(content)
-        total_chars += len(content)
-
-        if total_chars >= MAX_CONTEXT_CHARS:
-            break
+        if not degraded:
+            set_cached_context(cache_key, ())
+        return []
+
+    chunks = [
+        content for content in (chunk.strip() for chunk in chunks)
+        if len(content) >= MIN_CHUNK_LENGTH
+    ]
+    contexts, used_tokens = pack_chunks(
+        chunks,
+        load_chunk_tokens(source_id, chunks),
+        max_tokens
+    )
 
     final_context = "\n\n".join(contexts)
 
     # DEBUG
-    print("====== RAG CONTEXT PREVIEW ======")
+    print(f"====== RAG CONTEXT PREVIEW ({len(contexts)} chunk, {used_tokens}/{max_tokens} token) ======")
     print(final_context[:800])
     print("====== END CONTEXT ======")
 
     if len(final_context) < MIN_CONTEXT_CHARS:
         print("⚠️ Context quá ngắn:", len(final_context))
-        return ""
+        contexts = []
+
+    # Kết quả thiếu nhánh vector không cache → lần sau thử lại đủ cả 2 nhánh
+    if not degraded:
+        set_cached_context(cache_key, tuple(contexts))
+    return contexts
 
-    return final_context
+
+def retrieve_context_by_document(
+    document_id: int,
+    query: str,
+    k: int = 6,
+    lexical_query: Optional[str] = None,
+    max_tokens: int = MAX_CONTEXT_TOKENS
+) -> str:
+    """
+    Ngữ cảnh dạng text (các chunk nối bằng dòng trống), "" nếu không đủ ngữ cảnh
+    """
+    return "\n\n".join(
+        retrieve_chunks_by_document(document_id, query, k, lexical_query, max_tokens)
+    )
+
+
+# Retrieval là code sync (SQLite FTS5, vector store, embedding API)
+# → bản async cho API chạy nó ở thread riêng, không chặn event loop
+async def aretrieve_chunks_by_document(
+    document_id: int,
+    query: str,
+    k: int = 6,
+    lexical_query: Optional[str] = None,
+    max_tokens: int = MAX_CONTEXT_TOKENS
+) -> List[str]:
+    return await asyncio.to_thread(
+        retrieve_chunks_by_document, document_id, query, k, lexical_query, max_tokens
+    )
+
+
+async def aretrieve_context_by_document(
+    document_id: int,
+    query: str,
+    k: int = 6,
+    lexical_query: Optional[str] = None,
+    max_tokens: int = MAX_CONTEXT_TOKENS
+) -> str:
+    return "\n\n".join(
+        await aretrieve_chunks_by_document(document_id, query, k, lexical_query, max_tokens)
+    )
 
 
 # ======================================================
@@ -82,23 +188,20 @@ def retrieve_context(query: str, k: int = 6) -> str:
     """
     try:
         vectordb = load_vector_db()
-        docs = vectordb.similarity_search(query, k=k)
+        docs = vectordb.similarity_search_by_vector(embed_query(query), k=k)
     except Exception as e:
         print("❌ RAG search error:", e)
         return ""
 
-    contexts = []
-    total_chars = 0
-
-    for doc in docs:
-        content = doc.page_content.strip()
-        if not content or len(content) < MIN_CHUNK_LENGTH:
-            continue
-
-        contexts.append(content)
-        total_chars += len(content)
-        if total_chars >= MAX_CONTEXT_CHARS:
-            break
+    chunks = [
+        content for content in (doc.page_content.strip() for doc in docs)
+        if len(content) >= MIN_CHUNK_LENGTH
+    ]
+    contexts, _ = pack_chunks(
+        chunks,
+        [count_tokens(chunk) for chunk in chunks],
+        MAX_CONTEXT_TOKENS
+    )
 
     final_context = "\n\n".join(contexts)
     if len(final_context) < MIN_CONTEXT_CHARS:
@@ -108,31 +211,26 @@ def retrieve_context(query: str, k: int = 6) -> str:
 
 
 # ======================================================
-# RAG ANSWER (DÙNG CHO CHATBOX)
+# RAG ANSWER (DÙNG CHO CHAT /chat)
 # ======================================================
-def rag_answer(
-    question: str,
-    document_id: int
-) -> str:
-    """
-    Trả lời dựa trên RAG
-    → GẮN CHẶT THEO document_id
+async def aretrieve_answer_chunks(question: str, document_id: int) -> List[str]:
     """
-
-    retrieve_query = f"""
-    Khái niệm, định nghĩa, nguyên lý, công thức,
-    nội dung học tập quan trọng liên quan đến:
-    {question}
+    Chunk ngữ cảnh cho câu hỏi của user (/chat – stream qua build_answer_messages)
     """
-
-    context = retrieve_context_by_document(
+    return await aretrieve_chunks_by_document(
         document_id=document_id,
-        query=retrieve_query
+        query=RAG_ANSWER_QUERY_TEMPLATE.format(question=question),
+        lexical_query=question,
+        k=10,
+        max_tokens=context_budget(
+            RAG_ANSWER_TOKEN_BUDGET,
+            count_message_tokens(build_answer_messages(question, "")),
+            RAG_ANSWER_OUTPUT_TOKENS
+        )
     )
 
-    if not context:
-        return "Không tìm thấy thông tin trong tài liệu."
 
+def build_answer_messages(question: str, context: str) -> List[dict]:
     prompt = f"""
 Bạn là trợ lý học tập.
 
@@ -153,11 +251,4 @@ CÂU HỎI:
 
 TRẢ LỜI:
 """
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1
-    )
-
-    return response.choices[0].message.content.strip()
+    return [{"role": "user", "content": prompt}]
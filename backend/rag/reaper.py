@@ -0,0 +1,77 @@
+import queue
+import threading
+
+from rag.vector_store import delete_vectors
+from rag.retrieval_cache import invalidate_document
+from database.page_text import delete_pages, delete_chunks
+from database.ready_pool import delete_ready_items
+from database.document import delete_file_if_unreferenced
+
+# =====================
+# DỌN DỮ LIỆU SAU KHI XOÁ DOCUMENT (CHẠY NỀN)
+# =====================
+_queue: "queue.Queue[dict | None]" = queue.Queue()
+_worker = None
+_lock = threading.Lock()
+
+
+def _reap(task: dict):
+    """
+    Row SQL (document, flashcard, quiz) đã xoá đồng bộ trong delete_document
+    → ở đây chỉ làm phần nặng: xoá vector, text FTS, bộ sinh sẵn + file PDF
+    """
+    source_id = task["source_id"]
+
+    delete_vectors(source_id)
+    delete_pages(source_id)
+    delete_chunks(source_id)
+    delete_ready_items(source_id)
+    invalidate_document(source_id)
+    # File đặt tên theo sha256 → có thể đã được upload lại sau khi xoá
+    if task.get("filepath") and not delete_file_if_unreferenced(task["filepath"]):
+        print(f"ℹ️ Giữ file {task['filepath']} (đã được upload lại)")
+
+    print(f"🧹 Reaped source_id={source_id} (document_id={task['document_id']})")
+
+
+def _worker_loop():
+    while True:
+        task = _queue.get()
+        if task is None:
+            _queue.task_done()
+            break
+
+        try:
+            _reap(task)
+        except Exception as e:
+            # Phần còn sót sẽ được dọn bởi `python -m rag.compact`
+            print(f"❌ Reaper lỗi document_id={task.get('document_id')}:", e)
+        finally:
+            _queue.task_done()
+
+
+def enqueue_reap(document_id: int, source_id: int, filepath=None):
+    """
+    Gọi khi document cuối cùng dùng file / chunk bị xoá
+    """
+    _queue.put({
+        "document_id": document_id,
+        "source_id": source_id,
+        "filepath": filepath
+    })
+
+
+def start_reaper():
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, name="reaper", daemon=True)
+            _worker.start()
+
+
+def stop_reaper():
+    global _worker
+    with _lock:
+        if _worker is not None:
+            _queue.put(None)
+            _worker = None
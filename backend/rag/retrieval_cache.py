@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+from core.cache import LRUCache
+from rag.embedding_cache import normalize_text
+
+# =====================
+# CONFIG
+# =====================
+RETRIEVAL_CACHE_SIZE = 512
+RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+
+# Chunk của 1 document không đổi sau khi index → cache các chunk ngữ cảnh đã chọn
+# key = (source_id, fingerprint(query [+ lexical_query]), k, max_tokens), xoá khi index lại / xoá document
+_cache = LRUCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+
+
+def make_key(
+    source_id: int,
+    query: str,
+    k: int,
+    lexical_query: str = None,
+    max_tokens: int = None
+) -> tuple:
+    text = normalize_text(query)
+    if lexical_query:
+        text += "\n" + normalize_text(lexical_query)
+    fingerprint = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return (source_id, fingerprint, k, max_tokens)
+
+
+def get_cached_context(key: tuple):
+    return _cache.get(key)
+
+
+def set_cached_context(key: tuple, context: str):
+    _cache.set(key, context)
+
+
+def invalidate_document(source_id: int) -> int:
+    return _cache.pop_where(lambda key: key[0] == source_id)
+
+
+def get_retrieval_cache_stats() -> dict:
+    return _cache.stats()
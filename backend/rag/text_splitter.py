@@ -1,8 +1,48 @@
+from typing import Iterable, Iterator
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def split_text(text: str) -> list[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=150
+# =====================
+# CONFIG
+# =====================
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+STREAM_BUFFER_CHARS = CHUNK_SIZE * 8   # gom vài trang rồi mới split
+
+
+def _get_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
     )
-    return splitter.split_text(text)
+
+
+def split_text(text: str) -> list[str]:
+    return _get_splitter().split_text(text)
+
+
+def split_stream(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Split tăng dần theo trang: chỉ giữ một buffer nhỏ trong RAM
+    Chunk cuối của mỗi lần split có thể bị cắt dở → giữ lại, ghép với trang sau
+    """
+    splitter = _get_splitter()
+    buffer = ""
+
+    for page in pages:
+        if not page:
+            continue
+
+        buffer = f"{buffer}\n{page}" if buffer else page
+        if len(buffer) < STREAM_BUFFER_CHARS:
+            continue
+
+        chunks = splitter.split_text(buffer)
+        if len(chunks) <= 1:
+            continue
+
+        yield from chunks[:-1]
+        buffer = chunks[-1]
+
+    if buffer.strip():
+        yield from splitter.split_text(buffer)
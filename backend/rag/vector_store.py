@@ -1,27 +1,284 @@
-from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
+import chromadb
 import os
-from typing import List
+import threading
+from typing import List, Optional
+
+from rag.embeddings import get_provider
+from rag.embedding_cache import CachedEmbeddings, get_embedding_cache
+from rag.embedding_executor import ConcurrentEmbeddings
+from rag.numpy_store import NumpyVectorStore, NUMPY_INDEX_PATH
+from database.document import get_document_owner
+from database.vector_partition import get_partition, set_partition, delete_partition
 
 CHROMA_DB_PATH = "data/chroma_db"
 COLLECTION_NAME = "documents"
 
+# chroma → ChromaDB (mặc định)
+# numpy  → ma trận float32 memmap theo document (rag.numpy_store), phù hợp index nhỏ
+BACKEND_CHROMA = "chroma"
+BACKEND_NUMPY = "numpy"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", BACKEND_CHROMA)
+
+# global   → mọi chunk trong COLLECTION_NAME, filter theo document_id (mặc định)
+# document → mỗi nguồn index 1 collection riêng (doc_{id})
+# user     → mỗi user 1 shard (user_{id}), filter theo document_id trong shard
+PARTITION_GLOBAL = "global"
+PARTITION_DOCUMENT = "document"
+PARTITION_USER = "user"
+VECTOR_PARTITION_MODE = os.getenv("VECTOR_PARTITION_MODE", PARTITION_GLOBAL)
+
+# =====================
+# SINGLETON / PROCESS
+# =====================
+_lock = threading.RLock()
+_provider = None
+_executor = None
+_embeddings = None
+_query_embeddings = None
+_client = None
+_stores = {}
+_numpy_store = None
+
+
+def get_embedding_provider():
+    global _provider
+
+    with _lock:
+        if _provider is None:
+            _provider = get_provider()
+        return _provider
+
 
 def get_embeddings():
-    return OpenAIEmbeddings()
+    """
+    Embeddings theo EMBEDDING_PROVIDER (rag.embeddings), tạo 1 lần / process
+    Provider gọi API: cache theo nội dung chunk (dùng chung mọi document),
+    chunk chưa có trong cache được embed song song theo batch (ConcurrentEmbeddings)
+    Provider local: tính trực tiếp trên CPU, không cần cache
+    """
+    global _executor, _embeddings
+
+    if _embeddings is not None:
+        return _embeddings
+
+    with _lock:
+        if _embeddings is None:
+            provider = get_embedding_provider()
+            embeddings = provider.create()
+            if provider.remote:
+                _executor = ConcurrentEmbeddings(embeddings)
+                _embeddings = CachedEmbeddings(
+                    embeddings=_executor,
+                    model=provider.model,
+                    cache=get_embedding_cache()
+                )
+            else:
+                _embeddings = embeddings
+        return _embeddings
+
+
+def get_query_embeddings():
+    """
+    Embeddings cho câu hỏi lúc search (rag.query_embeddings đã cache kết quả)
+    Provider gọi API: HTTP timeout ngắn (QUERY_HTTP_TIMEOUT), không qua executor / cache chunk
+    """
+    global _query_embeddings
+
+    if _query_embeddings is not None:
+        return _query_embeddings
+
+    with _lock:
+        if _query_embeddings is None:
+            provider = get_embedding_provider()
+            _query_embeddings = provider.create_query() if provider.remote else get_embeddings()
+        return _query_embeddings
+
+
+def embedding_signature() -> dict:
+    """
+    {"embedding_model", "embedding_dim"} của provider hiện tại
+    """
+    return get_embedding_provider().signature()
+
+
+def check_embedding_signature(collection_name: str, metadata: Optional[dict], count: int) -> Optional[dict]:
+    """
+    Collection đã ghi model khác → lỗi (không trộn vector của 2 model)
+    Collection rỗng chưa ghi → trả về signature để ghi vào
+    Collection cũ có dữ liệu nhưng chưa ghi → không kiểm tra được, bỏ qua
+    """
+    signature = embedding_signature()
+    recorded = (metadata or {}).get("embedding_model")
+
+    if recorded is None:
+        return signature if count == 0 else None
+
+    if recorded != signature["embedding_model"]:
+        raise RuntimeError(
+            f"❌ Collection '{collection_name}' được index bằng {recorded} "
+            f"(dim={metadata.get('embedding_dim')}), provider hiện tại là "
+            f"{signature['embedding_model']} (dim={signature['embedding_dim']}) "
+            "– hãy dùng đúng EMBEDDING_PROVIDER hoặc index lại"
+        )
+    return None
+
+
+def _get_client():
+    """
+    1 PersistentClient / process, dùng chung cho mọi collection (partition)
+    """
+    global _client
+
+    if _client is not None:
+        return _client
+
+    with _lock:
+        if _client is None:
+            os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+            _client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        return _client
+
+
+def get_collection_store(collection_name: str):
+    """
+    Chroma (LangChain) cho 1 collection, mở 1 lần / process
+    """
+    store = _stores.get(collection_name)
+    if store is not None:
+        return store
+
+    with _lock:
+        store = _stores.get(collection_name)
+        if store is None:
+            # collection mới được ghi model / số chiều ngay khi tạo
+            store = Chroma(
+                client=_get_client(),
+                collection_name=collection_name,
+                embedding_function=get_embeddings(),
+                collection_metadata=embedding_signature()
+            )
+            collection = store._collection
+            stamp = check_embedding_signature(
+                collection_name, collection.metadata, collection.count()
+            )
+            if stamp:
+                collection.modify(metadata={**(collection.metadata or {}), **stamp})
+            _stores[collection_name] = store
+        return store
+
+
+def get_numpy_store() -> NumpyVectorStore:
+    global _numpy_store
+
+    if _numpy_store is not None:
+        return _numpy_store
+
+    with _lock:
+        if _numpy_store is None:
+            _numpy_store = NumpyVectorStore(
+                NUMPY_INDEX_PATH,
+                get_embeddings(),
+                model=embedding_signature()["embedding_model"]
+            )
+        return _numpy_store
 
 
 def get_or_create_vector_db():
     """
     Load hoặc tạo mới ChromaDB (KHÔNG ghi đè dữ liệu cũ)
+    → collection chung COLLECTION_NAME
     """
-    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+    return get_collection_store(COLLECTION_NAME)
 
-    return Chroma(
-        collection_name=COLLECTION_NAME,
-        persist_directory=CHROMA_DB_PATH,
-        embedding_function=get_embeddings()
-    )
+
+# =====================
+# PARTITION (ĐỊNH TUYẾN NGUỒN INDEX → COLLECTION)
+# =====================
+def partition_name(source_id: int, mode: str = VECTOR_PARTITION_MODE) -> str:
+    if mode == PARTITION_DOCUMENT:
+        return f"doc_{source_id}"
+
+    if mode == PARTITION_USER:
+        owner = get_document_owner(source_id)
+        if owner is not None:
+            return f"user_{owner}"
+
+    return COLLECTION_NAME
+
+
+def resolve_partition(source_id: int, create: bool = False) -> str:
+    """
+    Collection chứa chunk của source_id theo bảng định tuyến
+    Nguồn cũ chưa có route → collection chung
+    create=True: nguồn mới → chọn collection theo VECTOR_PARTITION_MODE + ghi route
+    """
+    collection = get_partition(source_id)
+    if collection:
+        return collection
+
+    if not create:
+        return COLLECTION_NAME
+
+    collection = partition_name(source_id)
+    set_partition(source_id, collection)
+    return collection
+
+
+def partition_filter(source_id: int):
+    """
+    Collection riêng của document → không cần filter metadata khi search
+    """
+    if VECTOR_BACKEND == BACKEND_NUMPY:
+        return {"document_id": source_id}
+
+    if resolve_partition(source_id) == partition_name(source_id, PARTITION_DOCUMENT):
+        return None
+    return {"document_id": source_id}
+
+
+def get_embedding_stats() -> dict:
+    """
+    Throughput embedding (chunks/s) + hit/miss của cache
+    """
+    return {
+        **embedding_signature(),
+        "executor": _executor.stats() if _executor else None,
+        "cache": get_embedding_cache().stats()
+    }
+
+
+def warm_up():
+    """
+    Gọi lúc startup: mở store + load segment để request đầu tiên không chịu chi phí này
+    """
+    if VECTOR_BACKEND == BACKEND_NUMPY:
+        print(f"✅ VectorDB (numpy) ready: {len(get_numpy_store().list_sources())} document")
+        return
+
+    vectordb = get_or_create_vector_db()
+    count = vectordb._collection.count()
+    print(f"✅ VectorDB ready: {count} chunks, {len(list_collections())} collection")
+
+
+def close_vector_db():
+    """
+    Gọi lúc shutdown: đóng HTTP pool của provider + bỏ tham chiếu store
+    """
+    global _provider, _executor, _embeddings, _query_embeddings, _client, _numpy_store
+
+    with _lock:
+        if _executor is not None:
+            _executor.close()
+        if _provider is not None:
+            _provider.close()
+        _provider = None
+        _executor = None
+        _embeddings = None
+        _query_embeddings = None
+        _client = None
+        _numpy_store = None
+        _stores.clear()
 
 
 def create_vector_db(
@@ -29,11 +286,14 @@ def create_vector_db(
     document_id: int
 ):
     """
-    Thêm chunks vào ChromaDB
+    Thêm chunks vào ChromaDB (collection theo partition của document_id)
     Gắn metadata document_id cho từng chunk
     """
 
-    vectordb = get_or_create_vector_db()
+    if VECTOR_BACKEND == BACKEND_NUMPY:
+        vectordb = get_numpy_store()
+    else:
+        vectordb = get_collection_store(resolve_partition(document_id, create=True))
 
     metadatas = [
         {"document_id": document_id}
@@ -48,15 +308,84 @@ def create_vector_db(
     return vectordb
 
 
-def load_vector_db():
+def load_vector_db(document_id: Optional[int] = None):
     """
     Load ChromaDB để search
+    document_id → collection chứa chunk của document đó (xem partition_filter)
     """
+    if VECTOR_BACKEND == BACKEND_NUMPY:
+        return get_numpy_store()
+
     if not os.path.exists(CHROMA_DB_PATH):
         raise RuntimeError("❌ ChromaDB chưa tồn tại – hãy upload PDF hoặc index trước")
 
-    return Chroma(
-        collection_name=COLLECTION_NAME,
-        persist_directory=CHROMA_DB_PATH,
-        embedding_function=get_embeddings()
-    )
+    if document_id is None:
+        return get_or_create_vector_db()
+
+    return get_collection_store(resolve_partition(document_id))
+
+
+def delete_vectors(document_id: int):
+    """
+    Xoá toàn bộ chunk gắn document_id khỏi ChromaDB
+    Collection riêng của document → drop cả collection
+    """
+    if VECTOR_BACKEND == BACKEND_NUMPY:
+        get_numpy_store().delete(where={"document_id": document_id})
+        return
+
+    if not os.path.exists(CHROMA_DB_PATH):
+        return
+
+    collection = resolve_partition(document_id)
+    if collection == partition_name(document_id, PARTITION_DOCUMENT):
+        delete_collection(collection)
+    else:
+        get_collection_store(collection).delete(where={"document_id": document_id})
+
+    delete_partition(document_id)
+
+
+# =====================
+# QUẢN TRỊ (COMPACTION / MIGRATION)
+# =====================
+def list_collections() -> List[str]:
+    if not os.path.exists(CHROMA_DB_PATH):
+        return []
+    # tuỳ phiên bản chromadb: trả về Collection hoặc tên
+    return [getattr(c, "name", c) for c in _get_client().list_collections()]
+
+
+def delete_collection(collection_name: str):
+    with _lock:
+        _stores.pop(collection_name, None)
+        _get_client().delete_collection(collection_name)
+
+
+def iter_vector_metadata(collection_name: str = COLLECTION_NAME, batch_size: int = 1000):
+    """
+    Duyệt toàn bộ (id, metadata) trong 1 collection theo trang
+    """
+    if not os.path.exists(CHROMA_DB_PATH):
+        return
+
+    vectordb = get_collection_store(collection_name)
+    offset = 0
+    while True:
+        page = vectordb.get(include=["metadatas"], limit=batch_size, offset=offset)
+        ids = page["ids"]
+        if not ids:
+            break
+
+        yield from zip(ids, page["metadatas"])
+        offset += len(ids)
+
+
+def delete_vector_ids(
+    ids: List[str],
+    collection_name: str = COLLECTION_NAME,
+    batch_size: int = 1000
+):
+    vectordb = get_collection_store(collection_name)
+    for start in range(0, len(ids), batch_size):
+        vectordb.delete(ids=ids[start:start + batch_size])
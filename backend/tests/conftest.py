@@ -0,0 +1,28 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Code backend import theo kiểu `from rag.x import ...` (chạy trong backend/)
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# core.llm bắt buộc có key lúc import; test không gọi API thật
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """
+    Trỏ database.db sang 1 file SQLite tạm (không đụng data/database.db)
+    """
+    import database.db as db
+
+    db.close_db()
+    path = tmp_path / "test.db"
+    monkeypatch.setattr(db, "DB_NAME", str(path))
+    monkeypatch.setattr(db, "_wal_ready", False)
+    yield path
+    db.close_db()
@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+import utils.deck_io as deck_io
+from utils.deck_io import DeckReader, detect_format, iter_export_chunks
+
+
+def read(data: str, fmt: str):
+    reader = DeckReader(io.BytesIO(data.encode("utf-8")), fmt)
+    return list(reader), reader.skipped
+
+
+@pytest.mark.parametrize("filename, fmt, expected", [
+    ("deck.csv", None, "csv"),
+    ("deck.JSONL", None, "ndjson"),
+    ("deck.txt", "json", "json"),
+    ("deck.txt", None, None),
+    (None, None, None),
+])
+def test_detect_format(filename, fmt, expected):
+    assert detect_format(filename, fmt) == expected
+
+
+def test_csv_aliases_bom_and_skipped_rows():
+    data = "\ufeffFront,Back\nq1,a1\n,a2\nq3,\n  q4  , a4 \n"
+    cards, skipped = read(data, "csv")
+
+    assert cards == [
+        {"question": "q1", "answer": "a1"},
+        {"question": "q4", "answer": "a4"},
+    ]
+    assert skipped == 2
+
+
+def test_csv_without_header_columns_is_rejected():
+    with pytest.raises(ValueError):
+        read("foo,bar\n1,2\n", "csv")
+
+
+def test_ndjson_skips_bad_lines_and_invalid_cards():
+    data = "\n".join([
+        json.dumps({"question": "q1", "answer": "a1"}),
+        "",
+        "{không phải json",
+        json.dumps({"term": "q2", "definition": "a2"}),
+        json.dumps({"question": "thiếu đáp án"}),
+        json.dumps(["không", "phải", "object"]),
+    ])
+    cards, skipped = read(data, "ndjson")
+
+    assert cards == [
+        {"question": "q1", "answer": "a1"},
+        {"question": "q2", "answer": "a2"},
+    ]
+    assert skipped == 3
+
+
+def test_json_wrapped_array_read_in_small_chunks(monkeypatch):
+    # đoạn đọc 3 byte → cắt giữa ký tự UTF-8 nhiều byte và giữa các object
+    monkeypatch.setattr(deck_io, "READ_CHUNK_SIZE", 3)
+    data = json.dumps({
+        "cards": [
+            {"question": "Mạng máy tính là gì?", "answer": "Tập hợp máy [kết nối]"},
+            {"question": "", "answer": "rỗng"},
+            {"front": "Giao thức", "back": "Quy ước \"truyền\" dữ liệu"},
+        ]
+    }, ensure_ascii=False)
+    cards, skipped = read(data, "json")
+
+    assert cards == [
+        {"question": "Mạng máy tính là gì?", "answer": "Tập hợp máy [kết nối]"},
+        {"question": "Giao thức", "answer": "Quy ước \"truyền\" dữ liệu"},
+    ]
+    assert skipped == 1
+
+
+def test_json_broken_object_counted_as_skipped():
+    cards, skipped = read('[{"question": "q1", "answer": "a1"}, {"question": }]', "json")
+
+    assert cards == [{"question": "q1", "answer": "a1"}]
+    assert skipped == 1
+
+
+def test_export_round_trip_csv_and_ndjson():
+    batches = [
+        [(1, "Bộ 1", "2026-01-01 10:00", "q1", "a, có dấu phẩy")],
+        [(1, "Bộ 1", "2026-01-01 10:00", "q2", "dòng\nmới")],
+    ]
+
+    csv_text = "".join(iter_export_chunks(batches, "csv"))
+    cards, skipped = read(csv_text, "csv")
+    assert [c["answer"] for c in cards] == ["a, có dấu phẩy", "dòng\nmới"]
+    assert skipped == 0
+
+    ndjson_text = "".join(iter_export_chunks(batches, "ndjson"))
+    cards, skipped = read(ndjson_text, "ndjson")
+    assert [c["question"] for c in cards] == ["q1", "q2"]
+    assert skipped == 0
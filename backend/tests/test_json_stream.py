@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from core.json_stream import JSONArrayStream, aiter_json_items
+
+
+def feed_all(text, step):
+    parser = JSONArrayStream()
+    items = []
+    for i in range(0, len(text), step):
+        items += parser.feed(text[i:i + step])
+    return parser, items
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 7, 1000])
+def test_objects_split_across_chunks(step):
+    text = '{"flashcards": [{"question": "q1", "answer": "a1"}, {"question": "q2", "answer": "a2"}]}'
+    parser, items = feed_all(text, step)
+
+    assert items == [
+        {"question": "q1", "answer": "a1"},
+        {"question": "q2", "answer": "a2"},
+    ]
+    assert parser.done
+    assert parser.skipped == 0
+
+
+@pytest.mark.parametrize("step", [1, 5, 1000])
+def test_bracket_inside_string_before_array(step):
+    # [ nằm trong chuỗi trước mảng thật không được nhận là đầu mảng
+    text = '{"note": "xem [mục 1] và \\"[\\"", "cards": [{"q": "a"}]}'
+    parser, items = feed_all(text, step)
+
+    assert items == [{"q": "a"}]
+    assert parser.done
+
+
+def test_brackets_and_escapes_inside_items():
+    text = '[{"q": "x]}", "a": "\\"{["}, {"q": "nested", "tags": ["a", "b"], "o": {"k": 1}}]'
+    parser, items = feed_all(text, 1)
+
+    assert items == [
+        {"q": "x]}", "a": '"{['},
+        {"q": "nested", "tags": ["a", "b"], "o": {"k": 1}},
+    ]
+    assert parser.done
+
+
+def test_markdown_fence_and_trailing_text():
+    text = 'Đây là kết quả:\n```json\n[{"a": 1}]\n```\nrồi [{"b": 2}]'
+    parser, items = feed_all(text, 4)
+
+    assert items == [{"a": 1}]
+    assert parser.done
+
+
+def test_broken_object_is_skipped_others_kept():
+    text = '[{"a": 1}, {"a": tru}, {"a": 3}]'
+    parser, items = feed_all(text, 3)
+
+    assert items == [{"a": 1}, {"a": 3}]
+    assert parser.skipped == 1
+
+
+def test_truncated_output_keeps_complete_objects():
+    text = '{"questions": [{"a": 1}, {"a": 2}, {"a": "bị cắt'
+    parser, items = feed_all(text, 4)
+
+    assert items == [{"a": 1}, {"a": 2}]
+    assert not parser.done
+
+
+def test_aiter_json_items_drains_stream_after_array_closes():
+    consumed = []
+
+    async def chunks():
+        for chunk in ['{"x": [{"a": 1}', ', {"a": 2}]', "}", " usage"]:
+            consumed.append(chunk)
+            yield chunk
+
+    async def collect():
+        return [item async for item in aiter_json_items(chunks())]
+
+    assert asyncio.run(collect()) == [{"a": 1}, {"a": 2}]
+    # đọc hết stream (chunk cuối mang usage / ghi cache) dù mảng đã đóng
+    assert len(consumed) == 4
@@ -0,0 +1,165 @@
+import sqlite3
+
+import pytest
+
+from database.migrations import MIGRATIONS, migrate, get_schema_version
+
+LATEST = max(version for version, _, _ in MIGRATIONS)
+
+# Schema trước khi có migration (init_db cũ): không index_status / content_hash / source_id,
+# không created_ts, flashcard_sets / quiz_templates không ON DELETE CASCADE
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE,
+    password TEXT
+);
+CREATE TABLE quiz_templates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    document_id INTEGER,
+    title TEXT NOT NULL,
+    questions_json TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (document_id) REFERENCES documents(id)
+);
+CREATE TABLE flashcard_sets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    document_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (document_id) REFERENCES documents(id)
+);
+CREATE TABLE flashcards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    set_id INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    FOREIGN KEY (set_id) REFERENCES flashcard_sets(id)
+        ON DELETE CASCADE
+);
+CREATE TABLE documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+INSERT INTO users (id, username, password) VALUES (1, 'u', 'p');
+INSERT INTO documents (id, user_id, filename, filepath, created_at)
+VALUES (1, 1, 'a.pdf', 'uploads/a.pdf', '2025-03-01 08:30');
+
+INSERT INTO flashcard_sets (id, user_id, document_id, title, created_at)
+VALUES (1, 1, 1, 'Bộ 1', '2025-03-02 09:00');
+INSERT INTO flashcards (set_id, question, answer) VALUES (1, 'q1', 'a1'), (1, 'q2', 'a2');
+
+-- document 99 đã bị xoá tay trước đây → set / thẻ / quiz mồ côi
+INSERT INTO flashcard_sets (id, user_id, document_id, title, created_at)
+VALUES (2, 1, 99, 'Mồ côi', '2025-03-03 10:00');
+INSERT INTO flashcards (set_id, question, answer) VALUES (2, 'q3', 'a3');
+
+INSERT INTO quiz_templates (id, user_id, document_id, title, questions_json, created_at)
+VALUES (1, 1, 1, 'Quiz 1', '[]', '2025-03-02 09:05'),
+       (2, 1, 99, 'Quiz mồ côi', '[]', '2025-03-03 10:05'),
+       (3, 1, NULL, 'Quiz tự do', '[]', '2025-03-04 11:00');
+"""
+
+
+def raw(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def indexes(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA index_list({table})")}
+
+
+def test_fresh_database_reaches_latest_version(temp_db):
+    assert migrate() == LATEST
+    assert get_schema_version() == LATEST
+
+    conn = raw(temp_db)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"documents", "document_blobs", "ingest_jobs", "flashcard_sets", "ready_pool"} <= tables
+    assert "idx_documents_user" in indexes(conn, "documents")
+
+
+def test_legacy_database_upgrade(temp_db):
+    # app cũ không bật foreign_keys → từng ghi được bản ghi mồ côi
+    conn = sqlite3.connect(temp_db)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+
+    assert migrate() == LATEST
+
+    conn = raw(temp_db)
+    # v1: cột mới, document cũ coi như đã index xong
+    assert conn.execute(
+        "SELECT index_status, content_hash, source_id FROM documents WHERE id = 1"
+    ).fetchone() == ("ready", None, None)
+
+    # v2: created_ts từ created_at, bỏ bản ghi mồ côi, giữ quiz không gắn document
+    created_ts = conn.execute("SELECT created_ts FROM documents WHERE id = 1").fetchone()[0]
+    assert created_ts > 0
+    assert [r[0] for r in conn.execute("SELECT id FROM flashcard_sets")] == [1]
+    assert [r[0] for r in conn.execute("SELECT question FROM flashcards ORDER BY id")] == ["q1", "q2"]
+    assert [r[0] for r in conn.execute("SELECT id FROM quiz_templates ORDER BY id")] == [1, 3]
+    assert conn.execute("SELECT created_ts FROM flashcard_sets").fetchone()[0] > created_ts
+
+    # v3: index cho query nóng
+    assert {"idx_flashcard_sets_user_document", "idx_flashcard_sets_document"} <= indexes(conn, "flashcard_sets")
+    assert "idx_flashcards_set" in indexes(conn, "flashcards")
+
+    # xoá document → set, thẻ, quiz xoá theo (ON DELETE CASCADE)
+    conn.execute("DELETE FROM documents WHERE id = 1")
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM flashcard_sets").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM flashcards").fetchone()[0] == 0
+    assert [r[0] for r in conn.execute("SELECT id FROM quiz_templates")] == [3]
+    conn.close()
+
+
+def test_migrate_is_idempotent(temp_db):
+    migrate()
+    conn = raw(temp_db)
+    conn.execute("INSERT INTO users (username, password) VALUES ('u', 'p')")
+    conn.commit()
+    conn.close()
+
+    assert migrate() == LATEST
+
+    conn = raw(temp_db)
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+    conn.close()
+
+
+def test_failed_migration_rolls_back(temp_db, monkeypatch):
+    def broken(cur):
+        cur.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("lỗi giữa chừng")
+
+    monkeypatch.setattr(
+        "database.migrations.MIGRATIONS",
+        MIGRATIONS + [(LATEST + 1, "broken", broken)]
+    )
+
+    with pytest.raises(RuntimeError):
+        migrate()
+
+    assert get_schema_version() == LATEST
+    conn = raw(temp_db)
+    assert conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'half_done'"
+    ).fetchone()[0] == 0
+    conn.close()
+
+    # khoá ngoại được bật lại cho connection trả về pool
+    from database.db import connection
+    with connection() as pooled:
+        assert pooled.execute("PRAGMA foreign_keys").fetchone()[0] == 1
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+import agent.question_agent as question_agent
+from agent.question_agent import _merge, _question_key
+
+
+def make_question(text):
+    return {
+        "question": text,
+        "options": {"A": "a", "B": "b", "C": "c", "D": "d"},
+        "correct_answer": "A"
+    }
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Mạng là gì?", "mạng   là gì"),
+    ("  TCP/IP là gì ?", "tcp ip là gì"),
+    ("Định nghĩa: OSI.", "định nghĩa osi"),
+])
+def test_question_key_ignores_case_punctuation_and_spacing(a, b):
+    assert _question_key(a) == _question_key(b)
+
+
+def test_question_key_keeps_different_questions_apart():
+    assert _question_key("Mạng là gì?") != _question_key("Mạng LAN là gì?")
+
+
+def test_merge_yields_in_completion_order():
+    async def stream(items, delay):
+        for item in items:
+            await asyncio.sleep(delay)
+            yield item
+
+    async def collect():
+        return [
+            item async for item in _merge([
+                stream(["slow-1", "slow-2"], 0.05),
+                stream(["fast-1", "fast-2"], 0.01),
+            ])
+        ]
+
+    result = asyncio.run(collect())
+    assert sorted(result) == ["fast-1", "fast-2", "slow-1", "slow-2"]
+    assert result[:2] == ["fast-1", "fast-2"]
+
+
+def test_merge_survives_failing_stream():
+    async def ok():
+        yield "ok"
+
+    async def broken():
+        raise RuntimeError("API lỗi")
+        yield  # pragma: no cover
+
+    async def collect():
+        return [item async for item in _merge([broken(), ok()])]
+
+    assert asyncio.run(collect()) == ["ok"]
+
+
+def test_merge_cancels_pending_streams_when_closed_early():
+    cancelled = []
+
+    async def fast():
+        yield "first"
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+            yield "never"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def take_one():
+        merged = _merge([fast(), slow()])
+        item = await merged.__anext__()
+        await merged.aclose()
+        return item
+
+    assert asyncio.run(take_one()) == "first"
+    assert cancelled == [True]
+
+
+def test_stream_mcq_dedupes_and_tops_up(monkeypatch):
+    calls = []
+
+    async def fake_batch(context, num_questions, avoid, semaphore):
+        calls.append((num_questions, list(avoid)))
+        round_no = len(calls)
+        if round_no <= 2:
+            # vòng đầu: 2 lời gọi trả về câu trùng nhau (khác hoa thường / dấu câu)
+            for i in range(num_questions):
+                yield make_question(f"Câu {i}?" if round_no == 1 else f"câu {i}")
+        else:
+            for i in range(num_questions):
+                yield make_question(f"Câu bù {round_no}-{i}")
+
+    monkeypatch.setattr(question_agent, "_stream_batch", fake_batch)
+
+    async def collect():
+        return [
+            q async for q in question_agent.stream_mcq_from_context(
+                document_id=0,
+                document_text="Mạng máy tính là tập hợp các máy tính kết nối với nhau. " * 40,
+                num_questions=10
+            )
+        ]
+
+    quiz = asyncio.run(collect())
+    keys = [_question_key(q["question"]) for q in quiz]
+
+    assert len(quiz) == 10
+    assert len(set(keys)) == 10
+    # vòng 1: 2 lời gọi × 5 câu, 5 câu bị trùng → vòng sinh bù xin đúng 5 câu, kèm danh sách tránh
+    assert [n for n, _ in calls] == [5, 5, 5]
+    assert calls[2][1] == [f"Câu {i}?" for i in range(5)]
+
+
+def test_stream_mcq_stops_after_top_up_rounds(monkeypatch):
+    calls = []
+
+    async def always_same(context, num_questions, avoid, semaphore):
+        calls.append(num_questions)
+        yield make_question("Luôn là câu này?")
+
+    monkeypatch.setattr(question_agent, "_stream_batch", always_same)
+
+    async def collect():
+        return [
+            q async for q in question_agent.stream_mcq_from_context(
+                document_id=0,
+                document_text="Nội dung ngắn về giao thức mạng. " * 40,
+                num_questions=3
+            )
+        ]
+
+    quiz = asyncio.run(collect())
+    assert [q["question"] for q in quiz] == ["Luôn là câu này?"]
+    assert len(calls) == 1 + question_agent.TOP_UP_ROUNDS
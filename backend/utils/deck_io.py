@@ -0,0 +1,153 @@
+import codecs
+import csv
+import io
+import json
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+from core.json_stream import JSONArrayStream
+
+# =====================
+# CONFIG
+# =====================
+DECK_FORMATS = ("csv", "json", "ndjson")
+EXPORT_FORMATS = ("ndjson", "csv")
+READ_CHUNK_SIZE = 64 * 1024
+
+# Tên cột chấp nhận khi import (deck Anki / Quizlet thường dùng front/back)
+QUESTION_KEYS = ("question", "front", "term")
+ANSWER_KEYS = ("answer", "back", "definition")
+
+EXPORT_COLUMNS = ["set_id", "set_title", "created_at", "question", "answer"]
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> Optional[str]:
+    """
+    Định dạng deck: tham số format (nếu có), không thì theo đuôi file
+    """
+    fmt = (fmt or Path(filename or "").suffix.lstrip(".")).lower()
+    if fmt == "jsonl":
+        fmt = "ndjson"
+    return fmt if fmt in DECK_FORMATS else None
+
+
+def _pick(item: Dict, keys) -> Optional[str]:
+    for key in keys:
+        value = item.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return None
+
+
+def normalize_card(item) -> Optional[Dict[str, str]]:
+    if not isinstance(item, dict):
+        return None
+
+    item = {str(k).strip().lower(): v for k, v in item.items() if k is not None}
+    question = _pick(item, QUESTION_KEYS)
+    answer = _pick(item, ANSWER_KEYS)
+    if not question or not answer:
+        return None
+
+    return {"question": question, "answer": answer}
+
+
+# =====================
+# IMPORT: ĐỌC DECK THEO LUỒNG
+# =====================
+class DeckReader:
+    """
+    Duyệt từng thẻ của deck CSV / JSON / NDJSON, đọc file theo đoạn
+    → deck hàng nghìn thẻ không phải nạp hết vào RAM
+    Dòng / object lỗi bị bỏ qua, đếm ở skipped
+    """
+
+    def __init__(self, binary: IO[bytes], fmt: str):
+        self.binary = binary
+        self.fmt = fmt
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        if self.fmt == "csv":
+            items = self._iter_csv()
+        elif self.fmt == "ndjson":
+            items = self._iter_ndjson()
+        else:
+            items = self._iter_json()
+
+        for item in items:
+            card = normalize_card(item)
+            if card is None:
+                self.skipped += 1
+                continue
+            yield card
+
+    def _text(self):
+        # utf-8-sig: bỏ BOM của file CSV xuất từ Excel
+        return io.TextIOWrapper(self.binary, encoding="utf-8-sig", newline="")
+
+    def _iter_csv(self):
+        text = self._text()
+        try:
+            reader = csv.DictReader(text)
+            columns = {(c or "").strip().lower() for c in reader.fieldnames or []}
+            if not columns & set(QUESTION_KEYS) or not columns & set(ANSWER_KEYS):
+                raise ValueError("❌ CSV cần có dòng tiêu đề với cột question, answer")
+            yield from reader
+        finally:
+            # không đóng file gốc (UploadFile tự đóng)
+            text.detach()
+
+    def _iter_ndjson(self):
+        text = self._text()
+        try:
+            for line in text:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    self.skipped += 1
+        finally:
+            text.detach()
+
+    def _iter_json(self):
+        # [ {...}, ... ] hoặc {"cards": [ ... ]} – parser tăng dần, không json.load cả file
+        parser = JSONArrayStream()
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        try:
+            while not parser.done:
+                chunk = self.binary.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield from parser.feed(decoder.decode(chunk))
+        finally:
+            self.skipped += parser.skipped
+
+
+# =====================
+# EXPORT: GHI DECK THEO LUỒNG
+# =====================
+def iter_export_chunks(batches: Iterable[List[tuple]], fmt: str) -> Iterator[str]:
+    """
+    batches: các lô (set_id, set_title, created_at, question, answer)
+    → mỗi lô thành 1 đoạn text NDJSON / CSV để stream ra response
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+        for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        return
+
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        )
@@ -1,11 +1,167 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+import pdfplumber
 from pypdf import PdfReader
 
-def load_pdf_text(file) -> str:
-    reader = PdfReader(file)
-    text = ""
+# =====================
+# CONFIG
+# =====================
+ENGINE_PYPDF = "pypdf"
+ENGINE_PDFPLUMBER = "pdfplumber"
+
+# "auto" → probe vài trang đầu rồi chọn engine cho từng file
+PDF_ENGINE = os.getenv("PDF_ENGINE", "auto")
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = 16          # số trang / 1 task gửi vào process pool
+PARALLEL_MIN_PAGES = 32      # file nhỏ hơn → extract tuần tự (tránh overhead IPC)
+PREFETCH_TASKS = 2           # số task đang chạy / worker → giới hạn RAM khi stream
+PROBE_PAGES = 3
+PROBE_MIN_RATIO = 0.8        # pypdf phải lấy được ≥ 80% text so với pdfplumber
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn thay vì fork: server đã có nhiều thread (ingest, reaper, pregen, retrieval)
+            # → fork lúc 1 thread đang giữ lock có thể làm process con treo
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# =====================
+# EXTRACT 1 KHOẢNG TRANG (CHẠY TRONG PROCESS CON)
+# =====================
+def _iter_range(source, engine: str, start: int, end: int) -> Iterator[str]:
+    if engine == ENGINE_PDFPLUMBER:
+        with pdfplumber.open(source) as pdf:
+            for i in range(start, end):
+                page = pdf.pages[i]
+                yield page.extract_text() or ""
+                page.close()  # giải phóng cache layout của trang
+        return
+
+    reader = PdfReader(source)
+    for i in range(start, end):
+        yield reader.pages[i].extract_text() or ""
+
+
+def _extract_range(source, engine: str, start: int, end: int) -> List[str]:
+    return list(_iter_range(source, engine, start, end))
+
+
+def count_pages(source) -> int:
+    return len(PdfReader(source).pages)
+
 
-    for page in reader.pages:
-        if page.extract_text():
-            text += page.extract_text() + "\n"
+# =====================
+# CHỌN ENGINE CHO TỪNG FILE
+# =====================
+def probe_engine(source) -> str:
+    """
+    pypdf nhanh hơn pdfplumber nhiều lần → mặc định dùng pypdf
+    Chỉ chuyển sang pdfplumber khi pypdf lấy thiếu text trên các trang mẫu
+    (font nhúng lạ, layout phức tạp…)
+    """
+    if PDF_ENGINE in (ENGINE_PYPDF, ENGINE_PDFPLUMBER):
+        return PDF_ENGINE
 
-    return text
+    total = count_pages(source)
+    end = min(PROBE_PAGES, total)
+    if end == 0:
+        return ENGINE_PYPDF
+
+    pypdf_chars = sum(len(t.strip()) for t in _extract_range(source, ENGINE_PYPDF, 0, end))
+    plumber_chars = sum(len(t.strip()) for t in _extract_range(source, ENGINE_PDFPLUMBER, 0, end))
+
+    if plumber_chars and pypdf_chars < plumber_chars * PROBE_MIN_RATIO:
+        return ENGINE_PDFPLUMBER
+
+    return ENGINE_PYPDF
+
+
+# =====================
+# STREAM TEXT THEO TRANG
+# =====================
+def iter_pages(
+    source,
+    engine: Optional[str] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> Iterator[str]:
+    """
+    Yield text từng trang (đúng thứ tự)
+    File lớn được chia thành các khoảng PAGES_PER_TASK trang, chạy song song
+    trên process pool; chỉ giữ tối đa EXTRACT_WORKERS * PREFETCH_TASKS khoảng
+    đang chạy nên RAM không phụ thuộc kích thước file.
+    source là đường dẫn (song song) hoặc file-like (tuần tự).
+    """
+    engine = engine or probe_engine(source)
+    total = count_pages(source)
+
+    is_path = isinstance(source, (str, os.PathLike))
+    if not is_path or total < PARALLEL_MIN_PAGES or EXTRACT_WORKERS <= 1:
+        for i, text in enumerate(_iter_range(source, engine, 0, total), start=1):
+            yield text
+            if on_progress:
+                on_progress(i, total)
+        return
+
+    path = os.fspath(source)
+    pool = _get_pool()
+    starts = iter(range(0, total, PAGES_PER_TASK))
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            end = min(start + PAGES_PER_TASK, total)
+            pending.append(pool.submit(_extract_range, path, engine, start, end))
+
+    for _ in range(EXTRACT_WORKERS * PREFETCH_TASKS):
+        submit_next()
+
+    done_pages = 0
+    try:
+        while pending:
+            texts = pending.popleft().result()
+            submit_next()
+
+            for text in texts:
+                done_pages += 1
+                yield text
+                if on_progress:
+                    on_progress(done_pages, total)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def extract_pages(
+    source,
+    engine: Optional[str] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> List[str]:
+    return list(iter_pages(source, engine=engine, on_progress=on_progress))
+
+
+def load_pdf_text(file) -> str:
+    return "\n".join(iter_pages(file))
@@ -22,6 +22,7 @@ export const api = {
     uploadPdf: (formData) => API.post('/upload/pdf', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
     }),
+    getUploadJob: (jobId) => API.get(`/upload/jobs/${jobId}`),
     deleteDocument: (docId, userId) => API.delete(`/documents/${docId}?user_id=${userId}`),
 
     // Flashcards
@@ -29,10 +30,55 @@ export const api = {
     listFlashcards: (userId, docId) => API.get(`/flashcard/list/${userId}`, { params: { document_id: docId } }),
     getFlashcardSet: (setId, userId) => API.get(`/flashcard/${setId}`, { params: { user_id: userId } }),
     deleteFlashcardSet: (setId, userId) => API.delete(`/flashcard/${setId}`, { params: { user_id: userId } }),
+    // Bulk deck import (CSV / JSON / NDJSON) and streamed export (ndjson | csv)
+    importFlashcards: (formData) => API.post('/flashcard/import', formData, {
+        headers: { 'Content-Type': 'multipart/form-data' }
+    }),
+    exportFlashcardsUrl: (userId, docId, format = 'ndjson') =>
+        `${API_BASE}/flashcard/export/${userId}?document_id=${docId}&format=${format}`,
 
     // Quiz
     createQuiz: (data) => API.post('/quiz/create', data),
     listQuizzes: (userId, docId) => API.get(`/quiz/list/${userId}`, { params: { document_id: docId } }),
     getQuiz: (quizId, userId) => API.get(`/quiz/${quizId}`, { params: { user_id: userId } }),
     deleteQuiz: (quizId, userId) => API.delete(`/quiz/${quizId}`, { params: { user_id: userId } }),
+
+    // Chat (SSE) – onEvent(event, data) for citations / token / done / error.
+    // Abort the AbortController passed as `signal` to cancel the answer.
+    streamChat: (docId, data, onEvent, signal) => streamSSE(`/chat/${docId}`, data, onEvent, signal),
+
+    // Flashcards / Quiz as they are generated – onEvent(event, data) for item / done / error.
+    streamFlashcards: (data, onEvent, signal) => streamSSE('/flashcard/stream', data, onEvent, signal),
+    streamQuiz: (data, onEvent, signal) => streamSSE('/quiz/stream', data, onEvent, signal),
 };
+
+async function streamSSE(path, data, onEvent, signal) {
+    const res = await fetch(`${API_BASE}${path}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(data),
+        signal,
+    });
+    if (!res.ok) {
+        const body = await res.json().catch(() => ({}));
+        throw new Error(body.detail || `HTTP ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            const event = raw.match(/^event: (.*)$/m)?.[1] || 'message';
+            const payload = raw.match(/^data: (.*)$/m)?.[1];
+            onEvent(event, payload ? JSON.parse(payload) : null);
+        }
+    }
+}